@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Literal
 
 
 class Settings(BaseSettings):
@@ -12,10 +13,33 @@ class Settings(BaseSettings):
     # OpenRouter API
     openrouter_api_key: str = ""
     openrouter_model: str = "anthropic/claude-3.5-sonnet"  # Default model
+    # LLM response cache: "enabled" reads and writes, "replay" only reads
+    # (a miss is an error), "disabled" always calls the API
+    llm_cache_mode: Literal["enabled", "replay", "disabled"] = "enabled"
+    # Per-process request/token budgets per minute for OpenRouter; 0 = unlimited
+    openrouter_rpm: int = 0
+    openrouter_tpm: int = 0
     
     # Storage
     upload_dir: str = "./uploads"
     output_dir: str = "./outputs"
+    database_path: str = "./manimgen.db"
+    # Render in warm worker processes when Manim is importable, else use the CLI
+    manim_in_process: bool = True
+    # Cairo by default: OpenGL output can differ from Cairo's without failing.
+    # "opengl" opts in to the GPU renderer, "auto" uses it when a GL context is
+    # available; either retries a scene with Cairo if OpenGL raises on it
+    manim_renderer: Literal["auto", "cairo", "opengl"] = "cairo"
+    # LaTeX and Text SVG caches kept across renders (each render's media dir is
+    # temporary); empty keeps them per render
+    manim_cache_dir: str = "./manim_cache"
+    # Parent of the per-render temp dirs; empty uses /dev/shm when it has 1 GiB
+    # free, else the system temp dir. On the same filesystem as output_dir,
+    # finished videos are moved instead of copied
+    render_temp_dir: str = ""
+    # On-disk cache of code validation verdicts (e.g. "./data/validation_cache.db");
+    # empty, the default, keeps verdicts in memory only
+    validation_cache_path: str = ""
     
     # CORS
     frontend_url: str = "http://localhost:3000"
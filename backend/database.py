@@ -0,0 +1,314 @@
+"""
+SQLite storage for projects, scenes, render jobs and cached LLM responses.
+
+Runs in WAL mode so several worker processes can read while one writes.
+Rows are returned as plain dicts in column order.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime
+from enum import Enum
+from typing import Dict, List, Optional
+
+import aiosqlite
+
+from config import get_settings
+
+settings = get_settings()
+
+PROJECT_COLUMNS = (
+    "id", "name", "description", "created_at", "updated_at", "scene_count", "audio_url",
+)
+SCENE_COLUMNS = (
+    "id", "project_id", "prompt", "code", "video_url", "thumbnail_url",
+    "duration_seconds", "order_index", "status", "error_message", "created_at", "updated_at",
+)
+JOB_COLUMNS = (
+    "id", "scene_id", "project_id", "status", "progress", "output_url", "error_message", "created_at",
+)
+
+_DATETIME_COLUMNS = frozenset({"created_at", "updated_at"})
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    description TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    scene_count INTEGER NOT NULL DEFAULT 0,
+    audio_url TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_projects_updated_at ON projects (updated_at);
+
+CREATE TABLE IF NOT EXISTS scenes (
+    id TEXT PRIMARY KEY,
+    project_id TEXT NOT NULL,
+    prompt TEXT NOT NULL,
+    code TEXT,
+    video_url TEXT,
+    thumbnail_url TEXT,
+    duration_seconds REAL NOT NULL DEFAULT 0,
+    order_index INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    error_message TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_scenes_project_order ON scenes (project_id, order_index);
+CREATE INDEX IF NOT EXISTS idx_scenes_updated_at ON scenes (updated_at);
+
+CREATE TABLE IF NOT EXISTS render_jobs (
+    id TEXT PRIMARY KEY,
+    scene_id TEXT,
+    project_id TEXT,
+    status TEXT NOT NULL,
+    progress INTEGER NOT NULL DEFAULT 0,
+    output_url TEXT,
+    error_message TEXT,
+    created_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS llm_cache (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+"""
+
+_connection: Optional[aiosqlite.Connection] = None
+_connect_lock = asyncio.Lock()
+
+# One shared connection per process: serialize writes so concurrent handlers
+# never interleave statements inside each other's transactions.
+write_lock = asyncio.Lock()
+
+
+async def get_db() -> aiosqlite.Connection:
+    """Return the process-wide connection, opening it on first use."""
+    global _connection
+    if _connection is None:
+        async with _connect_lock:
+            if _connection is None:
+                conn = await aiosqlite.connect(settings.database_path, isolation_level=None)
+                conn.row_factory = aiosqlite.Row
+                await conn.execute("PRAGMA journal_mode=WAL")
+                await conn.execute("PRAGMA synchronous=NORMAL")
+                await conn.execute("PRAGMA busy_timeout=5000")
+                await conn.executescript(SCHEMA)
+                _connection = conn
+    return _connection
+
+
+async def close_db() -> None:
+    """Close the process-wide connection."""
+    global _connection
+    if _connection is not None:
+        await _connection.close()
+        _connection = None
+
+
+@asynccontextmanager
+async def _transaction():
+    """Run statements in one write transaction, taking the write lock up front."""
+    db = await get_db()
+    async with write_lock:
+        await db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            await db.execute("ROLLBACK")
+            raise
+        else:
+            await db.execute("COMMIT")
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+
+def _decode_row(row: aiosqlite.Row) -> Dict:
+    record = {}
+    for key in row.keys():
+        value = row[key]
+        if key in _DATETIME_COLUMNS and value is not None:
+            value = datetime.fromisoformat(value)
+        record[key] = value
+    return record
+
+
+async def _fetch_one(query: str, params: tuple) -> Optional[Dict]:
+    db = await get_db()
+    async with db.execute(query, params) as cursor:
+        row = await cursor.fetchone()
+    return _decode_row(row) if row is not None else None
+
+
+async def _fetch_all(query: str, params: tuple = ()) -> List[Dict]:
+    db = await get_db()
+    async with db.execute(query, params) as cursor:
+        rows = await cursor.fetchall()
+    return [_decode_row(row) for row in rows]
+
+
+async def _insert(db: aiosqlite.Connection, table: str, columns: tuple, record: Dict) -> None:
+    placeholders = ", ".join("?" for _ in columns)
+    await db.execute(
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})",
+        tuple(_encode(record[c]) for c in columns)
+    )
+
+
+async def _update(table: str, columns: tuple, record_id: str, fields: Dict) -> bool:
+    """Update the given columns of one row; returns False if the row is missing."""
+    unknown = set(fields) - set(columns)
+    if unknown:
+        raise ValueError(f"Unknown {table} columns: {', '.join(sorted(unknown))}")
+
+    assignments = ", ".join(f"{c} = ?" for c in fields)
+    async with _transaction() as db:
+        cursor = await db.execute(
+            f"UPDATE {table} SET {assignments} WHERE id = ?",
+            (*(_encode(v) for v in fields.values()), record_id)
+        )
+        return cursor.rowcount > 0
+
+
+# Projects
+
+async def get_project(project_id: str) -> Optional[Dict]:
+    return await _fetch_one(
+        f"SELECT {', '.join(PROJECT_COLUMNS)} FROM projects WHERE id = ?", (project_id,)
+    )
+
+
+async def list_projects() -> List[Dict]:
+    return await _fetch_all(
+        f"SELECT {', '.join(PROJECT_COLUMNS)} FROM projects ORDER BY rowid"
+    )
+
+
+async def insert_project(project: Dict) -> None:
+    async with _transaction() as db:
+        await _insert(db, "projects", PROJECT_COLUMNS, project)
+
+
+async def update_project(project_id: str, **fields) -> bool:
+    return await _update("projects", PROJECT_COLUMNS, project_id, fields)
+
+
+async def delete_project(project_id: str) -> bool:
+    async with _transaction() as db:
+        cursor = await db.execute("DELETE FROM projects WHERE id = ?", (project_id,))
+        return cursor.rowcount > 0
+
+
+# Scenes
+
+async def get_scene(scene_id: str) -> Optional[Dict]:
+    return await _fetch_one(
+        f"SELECT {', '.join(SCENE_COLUMNS)} FROM scenes WHERE id = ?", (scene_id,)
+    )
+
+
+async def list_project_scenes(project_id: str) -> List[Dict]:
+    """Scenes of a project in order_index order (ties keep insertion order)."""
+    return await _fetch_all(
+        f"SELECT {', '.join(SCENE_COLUMNS)} FROM scenes "
+        "WHERE project_id = ? ORDER BY order_index, rowid",
+        (project_id,)
+    )
+
+
+async def add_scenes(project_id: str, scenes: List[Dict]) -> bool:
+    """
+    Append scenes to a project in one transaction.
+
+    Assigns each scene's order_index after the project's existing scenes and
+    refreshes the project's scene_count. Returns False if the project is missing.
+    """
+    now = datetime.utcnow()
+    async with _transaction() as db:
+        async with db.execute("SELECT 1 FROM projects WHERE id = ?", (project_id,)) as cursor:
+            if await cursor.fetchone() is None:
+                return False
+
+        async with db.execute(
+            "SELECT COUNT(*) FROM scenes WHERE project_id = ?", (project_id,)
+        ) as cursor:
+            (base_index,) = await cursor.fetchone()
+
+        for i, scene in enumerate(scenes):
+            scene["order_index"] = base_index + i
+            await _insert(db, "scenes", SCENE_COLUMNS, scene)
+
+        await db.execute(
+            "UPDATE projects SET scene_count = ?, updated_at = ? WHERE id = ?",
+            (base_index + len(scenes), _encode(now), project_id)
+        )
+    return True
+
+
+async def update_scene(scene_id: str, **fields) -> bool:
+    return await _update("scenes", SCENE_COLUMNS, scene_id, fields)
+
+
+async def delete_scene(scene_id: str) -> bool:
+    """Delete a scene and refresh its project's scene_count."""
+    now = datetime.utcnow()
+    async with _transaction() as db:
+        async with db.execute(
+            "SELECT project_id FROM scenes WHERE id = ?", (scene_id,)
+        ) as cursor:
+            row = await cursor.fetchone()
+        if row is None:
+            return False
+
+        await db.execute("DELETE FROM scenes WHERE id = ?", (scene_id,))
+        await db.execute(
+            "UPDATE projects SET "
+            "scene_count = (SELECT COUNT(*) FROM scenes WHERE project_id = ?), "
+            "updated_at = ? WHERE id = ?",
+            (row["project_id"], _encode(now), row["project_id"])
+        )
+    return True
+
+
+# Render jobs
+
+async def get_job(job_id: str) -> Optional[Dict]:
+    return await _fetch_one(
+        f"SELECT {', '.join(JOB_COLUMNS)} FROM render_jobs WHERE id = ?", (job_id,)
+    )
+
+
+async def insert_job(job: Dict) -> None:
+    async with _transaction() as db:
+        await _insert(db, "render_jobs", JOB_COLUMNS, job)
+
+
+async def update_job(job_id: str, **fields) -> bool:
+    return await _update("render_jobs", JOB_COLUMNS, job_id, fields)
+
+
+# LLM response cache
+
+async def get_llm_response(key: str) -> Optional[str]:
+    db = await get_db()
+    async with db.execute("SELECT response FROM llm_cache WHERE key = ?", (key,)) as cursor:
+        row = await cursor.fetchone()
+    return row["response"] if row is not None else None
+
+
+async def put_llm_response(key: str, model: str, response: str) -> None:
+    async with _transaction() as db:
+        await db.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, model, response, created_at) "
+            "VALUES (?, ?, ?, ?)",
+            (key, model, response, _encode(datetime.utcnow()))
+        )
@@ -0,0 +1,28 @@
+"""
+Gunicorn settings for running the API with multiple Uvicorn worker processes.
+
+Usage: gunicorn -c gunicorn_conf.py main:app
+"""
+import os
+import subprocess
+import sys
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+
+# State lives in the shared SQLite database, so workers are interchangeable
+workers = int(os.environ.get("WEB_CONCURRENCY", (os.cpu_count() or 1) * 2 + 1))
+
+# Picks uvloop and httptools automatically when they are installed
+worker_class = "uvicorn_worker.UvicornWorker"
+
+# Passed to Uvicorn as the per-worker concurrent connection limit
+worker_connections = 1000
+
+
+def when_ready(server):
+    # Warm LaTeX and the fonts once per machine, not once per worker, in a
+    # short-lived process so no Manim state stays resident
+    subprocess.Popen([
+        sys.executable, "-c",
+        "from services import render_service; render_service.run_warm_up()",
+    ])
@@ -1,17 +1,32 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from contextlib import asynccontextmanager
 import os
 
 from config import get_settings
+import database
 from routers import projects, scenes, render, audio
+from services import llm_service, manim_worker
 
 settings = get_settings()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Open the database (and create tables) before serving requests
+    await database.get_db()
+    yield
+    await llm_service.close_http_client()
+    manim_worker.shutdown()
+    await database.close_db()
+
+
 app = FastAPI(
     title=settings.app_name,
     description="AI-Powered Manim Video Generator API",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS configuration
@@ -38,11 +53,16 @@ app.include_router(render.router, prefix="/api/render", tags=["Render"])
 app.include_router(audio.router, prefix="/api/audio", tags=["Audio"])
 
 
+# Constant bodies, serialized once at import
+_ROOT_BODY = b'{"message":"Manim Video Generator API","status":"running"}'
+_HEALTH_BODY = b'{"status":"healthy"}'
+
+
 @app.get("/")
 async def root():
-    return {"message": "Manim Video Generator API", "status": "running"}
+    return Response(content=_ROOT_BODY, media_type="application/json")
 
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
+    return Response(content=_HEALTH_BODY, media_type="application/json")
@@ -1,17 +1,133 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
-from typing import Optional
+from python_multipart.multipart import MultipartParser, parse_options_header
+from typing import Optional, Tuple
 from datetime import datetime
+import asyncio
 import uuid
 import os
-import aiofiles
 
 from config import get_settings
-from .projects import projects_db
+import database as db
 
 router = APIRouter()
 settings = get_settings()
 
+# Resolved once at import; settings are frozen for the life of the process
+UPLOAD_DIR = settings.upload_dir
+
+# Pre-bound path helpers for the upload/delete handlers
+_join = os.path.join
+_splitext = os.path.splitext
+_basename = os.path.basename
+
+ALLOWED_AUDIO_TYPES = frozenset({"audio/mpeg", "audio/wav", "audio/mp3", "audio/x-wav"})
+
+# 64 KiB read/write blocks for streaming uploads to disk
+UPLOAD_CHUNK_SIZE = 1 << 16
+
+
+async def _receive_audio(request: Request) -> Tuple[str, str, str]:
+    """
+    Stream the "file" field of a multipart upload straight to UPLOAD_DIR.
+    
+    The body is fed to the multipart parser chunk by chunk and the file part is
+    written to its final path as it arrives, so there is no spooled temp copy.
+    Returns (audio_id, original filename, saved filename).
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type"))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload")
+    
+    audio_id = str(uuid.uuid4())
+    headers: dict = {}
+    header_field = bytearray()
+    header_value = bytearray()
+    pending: list = []
+    target: dict = {}  # filename/path of the file part once its headers are read
+    in_file = False
+    done = False
+    
+    def on_part_begin():
+        headers.clear()
+    
+    def on_header_field(data, start, end):
+        header_field.extend(data[start:end])
+    
+    def on_header_value(data, start, end):
+        header_value.extend(data[start:end])
+    
+    def on_header_end():
+        headers[bytes(header_field).lower()] = bytes(header_value)
+        header_field.clear()
+        header_value.clear()
+    
+    def on_headers_finished():
+        nonlocal in_file
+        _, options = parse_options_header(headers.get(b"content-disposition"))
+        if done or options.get(b"name") != b"file":
+            return
+        
+        # Validate file type before any of its bytes are written
+        part_type = headers.get(b"content-type", b"").decode("latin-1").strip()
+        if part_type not in ALLOWED_AUDIO_TYPES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid file type. Allowed: MP3, WAV"
+            )
+        
+        original = options.get(b"filename", b"").decode("utf-8", "replace")
+        target["original"] = original
+        target["filename"] = f"{audio_id}{_splitext(original)[1] or '.mp3'}"
+        in_file = True
+    
+    def on_part_data(data, start, end):
+        if in_file:
+            pending.append(data[start:end])
+    
+    def on_part_end():
+        nonlocal in_file, done
+        if in_file:
+            in_file = False
+            done = True
+    
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+    
+    f = None
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            if target and f is None:
+                f = await asyncio.to_thread(
+                    open, _join(UPLOAD_DIR, target["filename"]), 'wb',
+                    buffering=UPLOAD_CHUNK_SIZE
+                )
+            if pending:
+                data = b"".join(pending)
+                pending.clear()
+                await asyncio.to_thread(f.write, data)
+        parser.finalize()
+        
+        if not done:
+            raise HTTPException(status_code=400, detail="No audio file in upload")
+        await asyncio.to_thread(f.close)
+    except BaseException:
+        if f is not None:
+            f.close()
+            os.remove(f.name)
+        raise
+    
+    return audio_id, target["original"], target["filename"]
+
 
 class AudioUpload(BaseModel):
     id: str
@@ -34,40 +150,48 @@ class TTSRequest(BaseModel):
     voice: str = "default"
 
 
-@router.post("/upload/{project_id}", response_model=AudioResponse)
-async def upload_audio(project_id: str, file: UploadFile = File(...)):
+# The body is parsed by hand, so describe the form for the OpenAPI docs
+_UPLOAD_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                    "required": ["file"],
+                }
+            }
+        },
+    }
+}
+
+
+@router.post("/upload/{project_id}", response_model=AudioResponse, openapi_extra=_UPLOAD_BODY)
+async def upload_audio(project_id: str, request: Request):
     """Upload an audio file for a project."""
-    if project_id not in projects_db:
+    if await db.get_project(project_id) is None:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    # Validate file type
-    allowed_types = ["audio/mpeg", "audio/wav", "audio/mp3", "audio/x-wav"]
-    if file.content_type not in allowed_types:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Invalid file type. Allowed: MP3, WAV"
-        )
-    
-    # Generate unique filename
-    file_ext = os.path.splitext(file.filename)[1] or ".mp3"
-    audio_id = str(uuid.uuid4())
-    filename = f"{audio_id}{file_ext}"
-    filepath = os.path.join(settings.upload_dir, filename)
-    
-    # Save file
-    async with aiofiles.open(filepath, 'wb') as f:
-        content = await file.read()
-        await f.write(content)
+    # Validate and save the file part as it streams in
+    audio_id, original_filename, filename = await _receive_audio(request)
+    filepath = _join(UPLOAD_DIR, filename)
     
-    # Update project
+    # Update project (it may have been deleted while the upload was saving)
     audio_url = f"/uploads/{filename}"
-    projects_db[project_id]["audio_url"] = audio_url
-    projects_db[project_id]["updated_at"] = datetime.utcnow()
+    updated = await db.update_project(
+        project_id,
+        audio_url=audio_url,
+        updated_at=datetime.utcnow()
+    )
+    if not updated:
+        os.remove(filepath)
+        raise HTTPException(status_code=404, detail="Project not found")
     
     audio_data = {
         "id": audio_id,
         "project_id": project_id,
-        "filename": file.filename,
+        "filename": original_filename,
         "url": audio_url,
         "duration_seconds": None,  # Could be calculated
         "created_at": datetime.utcnow()
@@ -83,20 +207,20 @@ async def upload_audio(project_id: str, file: UploadFile = File(...)):
 @router.delete("/{project_id}")
 async def delete_audio(project_id: str):
     """Remove audio from a project."""
-    if project_id not in projects_db:
+    project = await db.get_project(project_id)
+    if project is None:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    project = projects_db[project_id]
     audio_url = project.get("audio_url")
+    await db.update_project(project_id, audio_url=None, updated_at=datetime.utcnow())
     
     if audio_url:
         # Delete file
-        filepath = os.path.join(settings.upload_dir, os.path.basename(audio_url))
-        if os.path.exists(filepath):
+        filepath = _join(UPLOAD_DIR, _basename(audio_url))
+        try:
             os.remove(filepath)
-    
-    project["audio_url"] = None
-    project["updated_at"] = datetime.utcnow()
+        except FileNotFoundError:
+            pass
     
     return {"success": True, "message": "Audio removed successfully"}
 
@@ -104,7 +228,7 @@ async def delete_audio(project_id: str):
 @router.post("/tts", response_model=AudioResponse)
 async def generate_tts(request: TTSRequest):
     """Generate text-to-speech audio (placeholder for TTS integration)."""
-    if request.project_id not in projects_db:
+    if await db.get_project(request.project_id) is None:
         raise HTTPException(status_code=404, detail="Project not found")
     
     # TODO: Integrate with a TTS service (Google Cloud TTS, ElevenLabs, etc.)
@@ -0,0 +1,31 @@
+"""
+Weak ETag helpers for the polled GET endpoints.
+"""
+import hashlib
+
+import orjson
+from fastapi import Request, Response
+
+
+def make_etag(*parts) -> str:
+    """Build a weak ETag from the values that identify a resource revision."""
+    # Stable across processes (unlike hash()), so any worker can answer a 304
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=8).hexdigest()
+    return f'W/"{digest}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Check whether the client's If-None-Match header already has this ETag."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return etag in (tag.strip() for tag in header.split(","))
+
+
+def json_response(payload: dict, etag: str) -> Response:
+    """Serialize a polled endpoint's body with orjson and attach its ETag."""
+    # Returning a Response skips FastAPI's jsonable_encoder and json.dumps;
+    # orjson writes the rows' datetimes and enums itself
+    return Response(content=orjson.dumps(payload), media_type="application/json", headers={"ETag": etag})
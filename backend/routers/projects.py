@@ -1,13 +1,14 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request, Response
 from pydantic import BaseModel
 from typing import Optional, List
 from datetime import datetime
+from functools import lru_cache
 import uuid
 
-router = APIRouter()
+import database as db
+from .etag import make_etag, etag_matches, json_response
 
-# In-memory storage (replace with database in production)
-projects_db: dict = {}
+router = APIRouter()
 
 
 class ProjectCreate(BaseModel):
@@ -36,6 +37,18 @@ class ProjectResponse(BaseModel):
     message: Optional[str] = None
 
 
+@lru_cache(maxsize=1024)
+def _project_model(*values) -> Project:
+    """Build the Project model once per distinct stored row."""
+    # Stored rows are server-written, so skip validation
+    return Project.model_construct(**dict(zip(db.PROJECT_COLUMNS, values)))
+
+
+def project_model(project: dict) -> Project:
+    """Return the cached Project model for a stored project row."""
+    return _project_model(*(project[c] for c in db.PROJECT_COLUMNS))
+
+
 @router.post("/", response_model=ProjectResponse)
 async def create_project(project: ProjectCreate):
     """Create a new project."""
@@ -49,60 +62,64 @@ async def create_project(project: ProjectCreate):
         "created_at": now,
         "updated_at": now,
         "scene_count": 0,
-        "scenes": [],
         "audio_url": None
     }
     
-    projects_db[project_id] = new_project
+    await db.insert_project(new_project)
     
     return ProjectResponse(
         success=True,
-        data=Project(**{k: v for k, v in new_project.items() if k != "scenes"}),
+        data=project_model(new_project),
         message="Project created successfully"
     )
 
 
 @router.get("/", response_model=dict)
-async def list_projects():
+async def list_projects(request: Request):
     """List all projects."""
-    projects = [
-        Project(**{k: v for k, v in p.items() if k != "scenes"})
-        for p in projects_db.values()
-    ]
-    return {"success": True, "data": projects}
+    rows = await db.list_projects()
+    
+    etag = make_etag(*((p["id"], p["updated_at"]) for p in rows))
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    projects = [{c: p[c] for c in db.PROJECT_COLUMNS} for p in rows]
+    return json_response({"success": True, "data": projects}, etag)
 
 
 @router.get("/{project_id}", response_model=ProjectResponse)
 async def get_project(project_id: str):
     """Get a specific project."""
-    if project_id not in projects_db:
+    project = await db.get_project(project_id)
+    if project is None:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    project = projects_db[project_id]
     return ProjectResponse(
         success=True,
-        data=Project(**{k: v for k, v in project.items() if k != "scenes"})
+        data=project_model(project)
     )
 
 
 @router.put("/{project_id}", response_model=ProjectResponse)
 async def update_project(project_id: str, update: ProjectUpdate):
     """Update a project."""
-    if project_id not in projects_db:
-        raise HTTPException(status_code=404, detail="Project not found")
-    
-    project = projects_db[project_id]
+    fields = {"updated_at": datetime.utcnow()}
     
     if update.name is not None:
-        project["name"] = update.name
+        fields["name"] = update.name
     if update.description is not None:
-        project["description"] = update.description
+        fields["description"] = update.description
     
-    project["updated_at"] = datetime.utcnow()
+    if not await db.update_project(project_id, **fields):
+        raise HTTPException(status_code=404, detail="Project not found")
+    
+    project = await db.get_project(project_id)
+    if project is None:
+        raise HTTPException(status_code=404, detail="Project not found")
     
     return ProjectResponse(
         success=True,
-        data=Project(**{k: v for k, v in project.items() if k != "scenes"}),
+        data=project_model(project),
         message="Project updated successfully"
     )
 
@@ -110,8 +127,7 @@ async def update_project(project_id: str, update: ProjectUpdate):
 @router.delete("/{project_id}")
 async def delete_project(project_id: str):
     """Delete a project."""
-    if project_id not in projects_db:
+    if not await db.delete_project(project_id):
         raise HTTPException(status_code=404, detail="Project not found")
     
-    del projects_db[project_id]
     return {"success": True, "message": "Project deleted successfully"}
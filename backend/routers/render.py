@@ -1,17 +1,20 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Request, Response
 from pydantic import BaseModel
 from typing import Optional
 from datetime import datetime
+from functools import lru_cache
+import asyncio
 import uuid
 
 from services.render_service import render_scene, compile_project
-from .scenes import scenes_db, SceneStatus, Scene
-from .projects import projects_db
+import database as db
+from .scenes import SceneStatus, Scene
+from .etag import make_etag, etag_matches
 
 router = APIRouter()
 
-# Render jobs storage
-render_jobs: dict = {}
+# Plain string: stored statuses are str, so readiness checks skip Enum.__eq__
+_COMPLETED = SceneStatus.completed.value
 
 
 class RenderJob(BaseModel):
@@ -31,66 +34,93 @@ class RenderResponse(BaseModel):
     message: Optional[str] = None
 
 
+@lru_cache(maxsize=1024)
+def _render_job_json(*values) -> bytes:
+    """Serialize a job's status response once per distinct stored row."""
+    return RenderResponse(
+        success=True,
+        data=RenderJob(**dict(zip(db.JOB_COLUMNS, values)))
+    ).model_dump_json().encode()
+
+
+def _new_job(scene_id: Optional[str], project_id: str) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "scene_id": scene_id,
+        "project_id": project_id,
+        "status": "pending",
+        "progress": 0,
+        "output_url": None,
+        "error_message": None,
+        "created_at": datetime.utcnow()
+    }
+
+
+def _rendered_fields(result: dict) -> dict:
+    return {
+        "video_url": result["video_url"],
+        "thumbnail_url": result.get("thumbnail_url"),
+        "duration_seconds": result.get("duration", 5.0),
+        "status": SceneStatus.completed,
+        "updated_at": datetime.utcnow(),
+    }
+
+
+async def _mark_scene_rendering(scene_id: str):
+    await db.update_scene(
+        scene_id,
+        status=SceneStatus.rendering,
+        updated_at=datetime.utcnow()
+    )
+
+
 async def process_render(job_id: str, scene_id: str):
     """Background task to render a scene."""
-    job = render_jobs[job_id]
-    scene = scenes_db[scene_id]
-    
     try:
-        job["status"] = "rendering"
-        job["progress"] = 10
-        scene["status"] = SceneStatus.rendering
+        scene = await db.get_scene(scene_id)
+        if scene is None:
+            raise Exception("Scene not found")
         
-        # Call render service
-        result = await render_scene(scene["code"], scene_id)
+        async def mark_rendering():
+            await db.update_job(job_id, status="rendering", progress=10)
+            await _mark_scene_rendering(scene_id)
         
-        job["progress"] = 100
-        job["status"] = "completed"
-        job["output_url"] = result["video_url"]
+        # Call render service; the statuses change once a render slot is free
+        result = await render_scene(scene["code"], scene_id, on_start=mark_rendering)
         
-        scene["video_url"] = result["video_url"]
-        scene["thumbnail_url"] = result.get("thumbnail_url")
-        scene["duration_seconds"] = result.get("duration", 5.0)
-        scene["status"] = SceneStatus.completed
-        scene["updated_at"] = datetime.utcnow()
+        await db.update_job(
+            job_id,
+            progress=100,
+            status="completed",
+            output_url=result["video_url"]
+        )
+        await db.update_scene(scene_id, **_rendered_fields(result))
         
     except Exception as e:
-        job["status"] = "failed"
-        job["error_message"] = str(e)
-        scene["status"] = SceneStatus.failed
-        scene["error_message"] = str(e)
-        scene["updated_at"] = datetime.utcnow()
+        await db.update_job(job_id, status="failed", error_message=str(e))
+        await db.update_scene(
+            scene_id,
+            status=SceneStatus.failed,
+            error_message=str(e),
+            updated_at=datetime.utcnow()
+        )
 
 
 @router.post("/scene/{scene_id}", response_model=RenderResponse)
 async def render_single_scene(scene_id: str, background_tasks: BackgroundTasks):
     """Start rendering a single scene."""
-    if scene_id not in scenes_db:
+    scene = await db.get_scene(scene_id)
+    if scene is None:
         raise HTTPException(status_code=404, detail="Scene not found")
     
-    scene = scenes_db[scene_id]
-    
     if not scene.get("code"):
         raise HTTPException(status_code=400, detail="Scene has no code to render")
     
-    job_id = str(uuid.uuid4())
-    now = datetime.utcnow()
-    
-    job = {
-        "id": job_id,
-        "scene_id": scene_id,
-        "project_id": scene["project_id"],
-        "status": "pending",
-        "progress": 0,
-        "output_url": None,
-        "error_message": None,
-        "created_at": now
-    }
-    
-    render_jobs[job_id] = job
+    job = _new_job(scene_id, scene["project_id"])
+    await db.insert_job(job)
     
     # Start background render task
-    background_tasks.add_task(process_render, job_id, scene_id)
+    background_tasks.add_task(process_render, job["id"], scene_id)
     
     return RenderResponse(
         success=True,
@@ -100,30 +130,34 @@ async def render_single_scene(scene_id: str, background_tasks: BackgroundTasks):
 
 
 @router.get("/job/{job_id}", response_model=RenderResponse)
-async def get_render_status(job_id: str):
+async def get_render_status(job_id: str, request: Request):
     """Get the status of a render job."""
-    if job_id not in render_jobs:
+    job = await db.get_job(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Render job not found")
     
-    return RenderResponse(
-        success=True,
-        data=RenderJob(**render_jobs[job_id])
+    etag = make_etag(job_id, job["progress"], job["status"])
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    body = _render_job_json(*(job[c] for c in db.JOB_COLUMNS))
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"ETag": etag, "Cache-Control": "no-cache"}
     )
 
 
 async def process_export(job_id: str, project_id: str):
     """Background task to export a complete project."""
-    job = render_jobs[job_id]
-    project = projects_db[project_id]
-    
     try:
-        job["status"] = "compiling"
-        job["progress"] = 10
+        await db.update_job(job_id, status="compiling", progress=10)
         
         # Get all completed scenes
-        scene_ids = project.get("scenes", [])
-        scenes = [scenes_db[sid] for sid in scene_ids if sid in scenes_db]
-        scenes.sort(key=lambda s: s["order_index"])
+        project = await db.get_project(project_id)
+        if project is None:
+            raise Exception("Project not found")
+        scenes = await db.list_project_scenes(project_id)
         
         # Compile all scenes
         result = await compile_project(
@@ -132,54 +166,40 @@ async def process_export(job_id: str, project_id: str):
             audio_url=project.get("audio_url")
         )
         
-        job["progress"] = 100
-        job["status"] = "completed"
-        job["output_url"] = result["video_url"]
+        await db.update_job(
+            job_id,
+            progress=100,
+            status="completed",
+            output_url=result["video_url"]
+        )
         
     except Exception as e:
-        job["status"] = "failed"
-        job["error_message"] = str(e)
+        await db.update_job(job_id, status="failed", error_message=str(e))
 
 
 @router.post("/export/{project_id}", response_model=RenderResponse)
 async def export_project(project_id: str, background_tasks: BackgroundTasks):
     """Export all scenes as a compiled video."""
-    if project_id not in projects_db:
+    if await db.get_project(project_id) is None:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    project = projects_db[project_id]
-    scene_ids = project.get("scenes", [])
+    scenes = await db.list_project_scenes(project_id)
     
-    if not scene_ids:
+    if not scenes:
         raise HTTPException(status_code=400, detail="Project has no scenes")
     
     # Check all scenes are rendered
-    for sid in scene_ids:
-        if sid in scenes_db:
-            scene = scenes_db[sid]
-            if scene["status"] != SceneStatus.completed:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Scene {sid} is not rendered yet"
-                )
+    for scene in scenes:
+        if scene["status"] != _COMPLETED:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Scene {scene['id']} is not rendered yet"
+            )
     
-    job_id = str(uuid.uuid4())
-    now = datetime.utcnow()
+    job = _new_job(None, project_id)
+    await db.insert_job(job)
     
-    job = {
-        "id": job_id,
-        "scene_id": None,
-        "project_id": project_id,
-        "status": "pending",
-        "progress": 0,
-        "output_url": None,
-        "error_message": None,
-        "created_at": now
-    }
-    
-    render_jobs[job_id] = job
-    
-    background_tasks.add_task(process_export, job_id, project_id)
+    background_tasks.add_task(process_export, job["id"], project_id)
     
     return RenderResponse(
         success=True,
@@ -190,42 +210,66 @@ async def export_project(project_id: str, background_tasks: BackgroundTasks):
 
 async def process_render_all_and_combine(job_id: str, project_id: str):
     """Background task to render all scenes and combine them into one video."""
-    job = render_jobs[job_id]
-    project = projects_db[project_id]
-    
     try:
-        scene_ids = project.get("scenes", [])
-        scenes = [scenes_db[sid] for sid in scene_ids if sid in scenes_db]
-        scenes.sort(key=lambda s: s["order_index"])
-        
+        scenes = await db.list_project_scenes(project_id)
         total_scenes = len(scenes)
         
-        # Phase 1: Render each scene (80% of progress)
-        for i, scene in enumerate(scenes):
-            scene_id = scene["id"]
+        # Phase 1: Render scenes that need it, several at a time (80% of progress)
+        to_render = [
+            (i, scene) for i, scene in enumerate(scenes)
+            if scene["status"] != _COMPLETED or not scene.get("video_url")
+        ]
+        
+        rendered = total_scenes - len(to_render)
+        
+        await db.update_job(
+            job_id,
+            status=f"Rendering scenes {rendered}/{total_scenes}",
+            progress=int((rendered / total_scenes) * 80)
+        )
+        
+        async def render_one(i: int, scene: dict):
+            nonlocal rendered
+            try:
+                result = await render_scene(
+                    scene["code"],
+                    scene["id"],
+                    on_start=lambda: _mark_scene_rendering(scene["id"])
+                )
+            except Exception as e:
+                await db.update_scene(
+                    scene["id"],
+                    status=SceneStatus.failed,
+                    error_message=str(e),
+                    updated_at=datetime.utcnow()
+                )
+                raise Exception(f"Failed to render scene {i+1}: {str(e)}")
             
-            job["status"] = f"Rendering scene {i+1}/{total_scenes}"
-            job["progress"] = int((i / total_scenes) * 80)
+            fields = _rendered_fields(result)
+            await db.update_scene(scene["id"], **fields)
+            scene.update(fields)
             
-            if scene["status"] != SceneStatus.completed or not scene.get("video_url"):
-                # Render this scene
-                scene["status"] = SceneStatus.rendering
-                
-                try:
-                    result = await render_scene(scene["code"], scene_id)
-                    scene["video_url"] = result["video_url"]
-                    scene["thumbnail_url"] = result.get("thumbnail_url")
-                    scene["duration_seconds"] = result.get("duration", 5.0)
-                    scene["status"] = SceneStatus.completed
-                    scene["updated_at"] = datetime.utcnow()
-                except Exception as e:
-                    scene["status"] = SceneStatus.failed
-                    scene["error_message"] = str(e)
-                    raise Exception(f"Failed to render scene {i+1}: {str(e)}")
+            rendered += 1
+            await db.update_job(
+                job_id,
+                status=f"Rendering scenes {rendered}/{total_scenes}",
+                progress=int((rendered / total_scenes) * 80)
+            )
+        
+        results = await asyncio.gather(
+            *(render_one(i, scene) for i, scene in to_render),
+            return_exceptions=True
+        )
+        errors = [r for r in results if isinstance(r, Exception)]
+        if errors:
+            raise errors[0]
         
         # Phase 2: Combine all scenes (remaining 20%)
-        job["status"] = "Combining scenes"
-        job["progress"] = 85
+        await db.update_job(job_id, status="Combining scenes", progress=85)
+        
+        project = await db.get_project(project_id)
+        if project is None:
+            raise Exception("Project not found")
         
         result = await compile_project(
             scenes=scenes,
@@ -233,13 +277,15 @@ async def process_render_all_and_combine(job_id: str, project_id: str):
             audio_url=project.get("audio_url")
         )
         
-        job["progress"] = 100
-        job["status"] = "completed"
-        job["output_url"] = result["video_url"]
+        await db.update_job(
+            job_id,
+            progress=100,
+            status="completed",
+            output_url=result["video_url"]
+        )
         
     except Exception as e:
-        job["status"] = "failed"
-        job["error_message"] = str(e)
+        await db.update_job(job_id, status="failed", error_message=str(e))
 
 
 @router.post("/render-all/{project_id}", response_model=RenderResponse)
@@ -250,45 +296,29 @@ async def render_all_and_combine(project_id: str, background_tasks: BackgroundTa
     1. Renders each scene that hasn't been rendered yet
     2. Combines all rendered scenes into one video
     """
-    if project_id not in projects_db:
+    if await db.get_project(project_id) is None:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    project = projects_db[project_id]
-    scene_ids = project.get("scenes", [])
+    scenes = await db.list_project_scenes(project_id)
     
-    if not scene_ids:
+    if not scenes:
         raise HTTPException(status_code=400, detail="Project has no scenes to render")
     
     # Check all scenes have code
-    for sid in scene_ids:
-        if sid in scenes_db:
-            scene = scenes_db[sid]
-            if not scene.get("code"):
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Scene '{scene.get('prompt', sid)}' has no code"
-                )
-    
-    job_id = str(uuid.uuid4())
-    now = datetime.utcnow()
-    
-    job = {
-        "id": job_id,
-        "scene_id": None,
-        "project_id": project_id,
-        "status": "pending",
-        "progress": 0,
-        "output_url": None,
-        "error_message": None,
-        "created_at": now
-    }
+    for scene in scenes:
+        if not scene.get("code"):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Scene '{scene.get('prompt', scene['id'])}' has no code"
+            )
     
-    render_jobs[job_id] = job
+    job = _new_job(None, project_id)
+    await db.insert_job(job)
     
-    background_tasks.add_task(process_render_all_and_combine, job_id, project_id)
+    background_tasks.add_task(process_render_all_and_combine, job["id"], project_id)
     
     return RenderResponse(
         success=True,
         data=RenderJob(**job),
-        message=f"Started rendering {len(scene_ids)} scenes"
+        message=f"Started rendering {len(scenes)} scenes"
     )
@@ -1,12 +1,14 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Request, Response
 from pydantic import BaseModel
 from typing import Optional, List
 from datetime import datetime
 from enum import Enum
+from functools import lru_cache
 import uuid
 
-from services.llm_service import generate_manim_code, get_multi_scene_codes
-from .projects import projects_db
+from services.llm_service import generate_manim_code, aget_multi_scene_codes
+import database as db
+from .etag import make_etag, etag_matches, json_response
 
 router = APIRouter()
 
@@ -51,22 +53,27 @@ class SceneResponse(BaseModel):
     message: Optional[str] = None
 
 
-# In-memory scenes storage
-scenes_db: dict = {}
+@lru_cache(maxsize=1024)
+def _scene_model(*values) -> Scene:
+    """Build the Scene model once per distinct stored row."""
+    # Stored rows are server-written, so skip validation; only the status
+    # needs turning back into the enum the serializer expects.
+    scene = dict(zip(db.SCENE_COLUMNS, values))
+    scene["status"] = SceneStatus(scene["status"])
+    return Scene.model_construct(**scene)
+
+
+def scene_model(scene: dict) -> Scene:
+    """Return the cached Scene model for a stored scene row."""
+    return _scene_model(*(scene[c] for c in db.SCENE_COLUMNS))
 
 
 @router.post("/", response_model=SceneResponse)
 async def create_scene(scene: SceneCreate):
     """Create a new scene and generate Manim code."""
-    if scene.project_id not in projects_db:
-        raise HTTPException(status_code=404, detail="Project not found")
-    
     scene_id = str(uuid.uuid4())
     now = datetime.utcnow()
     
-    project = projects_db[scene.project_id]
-    order_index = len(project.get("scenes", []))
-    
     new_scene = {
         "id": scene_id,
         "project_id": scene.project_id,
@@ -75,88 +82,83 @@ async def create_scene(scene: SceneCreate):
         "video_url": None,
         "thumbnail_url": None,
         "duration_seconds": 0,
-        "order_index": order_index,
+        "order_index": None,  # assigned by add_scenes
         "status": SceneStatus.generating,
         "error_message": None,
         "created_at": now,
         "updated_at": now
     }
     
-    scenes_db[scene_id] = new_scene
-    project["scenes"].append(scene_id)
-    project["scene_count"] = len(project["scenes"])
+    if not await db.add_scenes(scene.project_id, [new_scene]):
+        raise HTTPException(status_code=404, detail="Project not found")
     
-    # Generate Manim code using LLM
+    # Generate Manim code using LLM (outside any transaction, this can take seconds)
     try:
         generated_code = await generate_manim_code(scene.prompt)
-        new_scene["code"] = generated_code
-        new_scene["status"] = SceneStatus.pending
-        new_scene["updated_at"] = datetime.utcnow()
+        changes = {"code": generated_code, "status": SceneStatus.pending}
     except Exception as e:
-        new_scene["status"] = SceneStatus.failed
-        new_scene["error_message"] = str(e)
-        new_scene["updated_at"] = datetime.utcnow()
+        changes = {"status": SceneStatus.failed, "error_message": str(e)}
+    changes["updated_at"] = datetime.utcnow()
+    await db.update_scene(scene_id, **changes)
+    new_scene.update(changes)
     
     return SceneResponse(
         success=True,
-        data=Scene(**new_scene),
+        data=Scene.model_construct(**new_scene),
         message="Scene created successfully"
     )
 
 
 @router.get("/project/{project_id}", response_model=dict)
-async def list_scenes(project_id: str):
+async def list_scenes(project_id: str, request: Request):
     """List all scenes for a project."""
-    if project_id not in projects_db:
+    if await db.get_project(project_id) is None:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    project = projects_db[project_id]
-    scene_ids = project.get("scenes", [])
+    rows = await db.list_project_scenes(project_id)
     
-    scenes = [
-        Scene(**scenes_db[sid])
-        for sid in scene_ids
-        if sid in scenes_db
-    ]
+    etag = make_etag(project_id, *((row["id"], row["updated_at"]) for row in rows))
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
     
-    # Sort by order_index
-    scenes.sort(key=lambda s: s.order_index)
+    scenes = [{c: row[c] for c in db.SCENE_COLUMNS} for row in rows]
     
-    return {"success": True, "data": scenes}
+    return json_response({"success": True, "data": scenes}, etag)
 
 
 @router.get("/{scene_id}", response_model=SceneResponse)
-async def get_scene(scene_id: str):
+async def get_scene(scene_id: str, request: Request):
     """Get a specific scene."""
-    if scene_id not in scenes_db:
+    scene = await db.get_scene(scene_id)
+    if scene is None:
         raise HTTPException(status_code=404, detail="Scene not found")
     
-    return SceneResponse(
-        success=True,
-        data=Scene(**scenes_db[scene_id])
+    etag = make_etag(scene_id, scene["updated_at"])
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    return json_response(
+        {"success": True, "data": {c: scene[c] for c in db.SCENE_COLUMNS}, "message": None},
+        etag
     )
 
 
 @router.put("/{scene_id}", response_model=SceneResponse)
 async def update_scene(scene_id: str, update: SceneUpdate):
     """Update a scene."""
-    if scene_id not in scenes_db:
-        raise HTTPException(status_code=404, detail="Scene not found")
-    
-    scene = scenes_db[scene_id]
+    fields = update.model_dump(exclude_none=True)
+    fields["updated_at"] = datetime.utcnow()
     
-    if update.prompt is not None:
-        scene["prompt"] = update.prompt
-    if update.code is not None:
-        scene["code"] = update.code
-    if update.order_index is not None:
-        scene["order_index"] = update.order_index
+    if not await db.update_scene(scene_id, **fields):
+        raise HTTPException(status_code=404, detail="Scene not found")
     
-    scene["updated_at"] = datetime.utcnow()
+    scene = await db.get_scene(scene_id)
+    if scene is None:
+        raise HTTPException(status_code=404, detail="Scene not found")
     
     return SceneResponse(
         success=True,
-        data=Scene(**scene),
+        data=scene_model(scene),
         message="Scene updated successfully"
     )
 
@@ -164,51 +166,45 @@ async def update_scene(scene_id: str, update: SceneUpdate):
 @router.delete("/{scene_id}")
 async def delete_scene(scene_id: str):
     """Delete a scene."""
-    if scene_id not in scenes_db:
+    if not await db.delete_scene(scene_id):
         raise HTTPException(status_code=404, detail="Scene not found")
-    
-    scene = scenes_db[scene_id]
-    project_id = scene["project_id"]
-    
-    if project_id in projects_db:
-        project = projects_db[project_id]
-        if scene_id in project.get("scenes", []):
-            project["scenes"].remove(scene_id)
-            project["scene_count"] = len(project["scenes"])
-    
-    del scenes_db[scene_id]
     return {"success": True, "message": "Scene deleted successfully"}
 
 
 @router.post("/{scene_id}/regenerate", response_model=SceneResponse)
 async def regenerate_scene(scene_id: str, new_prompt: Optional[str] = None):
     """Regenerate a scene with a new or existing prompt."""
-    if scene_id not in scenes_db:
+    scene = await db.get_scene(scene_id)
+    if scene is None:
         raise HTTPException(status_code=404, detail="Scene not found")
     
-    scene = scenes_db[scene_id]
     prompt = new_prompt or scene["prompt"]
-    
-    scene["status"] = SceneStatus.generating
-    scene["updated_at"] = datetime.utcnow()
+    await db.update_scene(
+        scene_id,
+        status=SceneStatus.generating,
+        updated_at=datetime.utcnow()
+    )
     
     try:
-        generated_code = await generate_manim_code(prompt)
-        scene["code"] = generated_code
-        scene["prompt"] = prompt
-        scene["status"] = SceneStatus.pending
-        scene["video_url"] = None
-        scene["thumbnail_url"] = None
-        scene["error_message"] = None
-        scene["updated_at"] = datetime.utcnow()
+        # Regenerating must produce new code, never the cached generation
+        generated_code = await generate_manim_code(prompt, use_cache=False)
+        changes = {
+            "code": generated_code,
+            "prompt": prompt,
+            "status": SceneStatus.pending,
+            "video_url": None,
+            "thumbnail_url": None,
+            "error_message": None,
+        }
     except Exception as e:
-        scene["status"] = SceneStatus.failed
-        scene["error_message"] = str(e)
-        scene["updated_at"] = datetime.utcnow()
+        changes = {"status": SceneStatus.failed, "error_message": str(e)}
+    changes["updated_at"] = datetime.utcnow()
+    await db.update_scene(scene_id, **changes)
+    scene.update(changes)
     
     return SceneResponse(
         success=True,
-        data=Scene(**scene),
+        data=scene_model(scene),
         message="Scene regenerated successfully"
     )
 
@@ -231,41 +227,35 @@ async def create_multi_scenes(request: MultiSceneCreate):
     Create multiple scenes from a single prompt.
     Generates a sequence of related scenes for a ~30 second video.
     """
-    if request.project_id not in projects_db:
+    if await db.get_project(request.project_id) is None:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    project = projects_db[request.project_id]
+    # Generate multiple scene codes (concurrent LLM calls, or templates in demo mode)
+    scene_data = await aget_multi_scene_codes(request.prompt, request.num_scenes)
     
-    # Generate multiple scene codes
-    scene_data = get_multi_scene_codes(request.prompt, request.num_scenes)
-    
-    created_scenes = []
     now = datetime.utcnow()
-    
-    for i, (scene_prompt, scene_code) in enumerate(scene_data):
-        scene_id = str(uuid.uuid4())
-        order_index = len(project.get("scenes", [])) + i
-        
-        new_scene = {
-            "id": scene_id,
+    new_scenes = [
+        {
+            "id": str(uuid.uuid4()),
             "project_id": request.project_id,
             "prompt": scene_prompt,
             "code": scene_code,
             "video_url": None,
             "thumbnail_url": None,
             "duration_seconds": 0,
-            "order_index": order_index,
+            "order_index": None,  # assigned by add_scenes
             "status": SceneStatus.pending,
             "error_message": None,
             "created_at": now,
             "updated_at": now
         }
-        
-        scenes_db[scene_id] = new_scene
-        project["scenes"].append(scene_id)
-        created_scenes.append(Scene(**new_scene))
+        for scene_prompt, scene_code in scene_data
+    ]
+    
+    if not await db.add_scenes(request.project_id, new_scenes):
+        raise HTTPException(status_code=404, detail="Project not found")
     
-    project["scene_count"] = len(project["scenes"])
+    created_scenes = [Scene.model_construct(**new_scene) for new_scene in new_scenes]
     
     return MultiSceneResponse(
         success=True,
@@ -1,5 +1,18 @@
-from .llm_service import generate_manim_code
-from .render_service import render_scene, compile_project
-from .code_validator import validate_manim_code
+# Submodules are imported on first attribute access, so importing one service
+# (e.g. services.render_service) does not pull in the others
+_EXPORTS = {
+    "generate_manim_code": "llm_service",
+    "render_scene": "render_service",
+    "compile_project": "render_service",
+    "validate_manim_code": "code_validator",
+}
 
 __all__ = ["generate_manim_code", "render_scene", "compile_project", "validate_manim_code"]
+
+
+def __getattr__(name: str):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+    return getattr(import_module(f".{module}", __name__), name)
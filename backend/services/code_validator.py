@@ -3,8 +3,20 @@ Code validator for Manim scripts.
 Ensures generated code is safe and valid before execution.
 """
 import ast
+import hashlib
+import os
 import re
-from typing import Tuple, List
+import sqlite3
+import threading
+from functools import lru_cache
+from typing import Iterator, List, Optional, Tuple
+
+from config import get_settings
+
+try:
+    import ahocorasick  # optional: single-pass multi-literal matcher
+except ImportError:
+    ahocorasick = None
 
 # Allowed imports for Manim scripts
 ALLOWED_IMPORTS = {
@@ -16,6 +28,10 @@ ALLOWED_IMPORTS = {
     "functools",
 }
 
+# Size limits, checked before any parsing; generated scenes are far smaller
+MAX_CODE_LENGTH = 200_000  # characters
+MAX_CODE_LINES = 5000
+
 # Dangerous patterns that should be blocked
 DANGEROUS_PATTERNS = [
     r"\bos\.",
@@ -26,12 +42,6 @@ DANGEROUS_PATTERNS = [
     r"\bexec\s*\(",
     r"\bcompile\s*\(",
     r"\b__import__\s*\(",
-    r"\bimport\s+os\b",
-    r"\bimport\s+sys\b",
-    r"\bimport\s+subprocess\b",
-    r"\bfrom\s+os\b",
-    r"\bfrom\s+sys\b",
-    r"\bfrom\s+subprocess\b",
     r"\bshutil\.",
     r"\brequests\.",
     r"\burllib\.",
@@ -39,64 +49,178 @@ DANGEROUS_PATTERNS = [
     r"\bpickle\.",
 ]
 
+# All patterns as one alternation so the code is scanned in a single pass;
+# group g<i> identifies DANGEROUS_PATTERNS[i]
+_COMBINED_PATTERN = re.compile(
+    "|".join(f"(?P<g{i}>{pattern})" for i, pattern in enumerate(DANGEROUS_PATTERNS))
+)
+_GROUP_TO_INDEX = {f"g{i}": i for i in range(len(DANGEROUS_PATTERNS))}
+
+# Rejection message per pattern, built once so the error path is a lookup
+_DANGER_MESSAGES = tuple(
+    f"Code contains dangerous pattern: {pattern}" for pattern in DANGEROUS_PATTERNS
+)
+
+
+def _match_index(match: "re.Match[str]") -> int:
+    # Every alternative is a named group, so lastgroup is always set
+    return _GROUP_TO_INDEX[match.lastgroup or ""]
+
+_CALL_SUFFIX = r"\s*\("
+
+
+def _literal_core(pattern: str) -> Tuple[str, bool]:
+    """Split r"\bname\." / r"\bname\s*\(" into (plain literal, is_call)."""
+    body = pattern[2:]  # drop the leading \b
+    if body.endswith(_CALL_SUFFIX):
+        return body[:-len(_CALL_SUFFIX)], True
+    return body.replace("\\.", "."), False
+
+
+_LITERAL_CORES = tuple(_literal_core(pattern) for pattern in DANGEROUS_PATTERNS)
+
+# Plain substrings, at least one of which occurs wherever any pattern above
+# matches. Clean code rarely contains them, so a few C-level `in` checks
+# usually let us skip the regex pass entirely.
+_DANGER_LITERALS = tuple(literal for literal, _ in _LITERAL_CORES)
+
+# With pyahocorasick installed, all literals are found in one automaton pass
+# and the \b / \s*\( parts of each pattern are checked around the hit.
+if ahocorasick is not None:
+    _AUTOMATON = ahocorasick.Automaton()
+    for _index, (_literal, _is_call) in enumerate(_LITERAL_CORES):
+        _AUTOMATON.add_word(_literal, (len(_literal), _index, _is_call))
+    _AUTOMATON.make_automaton()
+else:
+    _AUTOMATON = None
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+def _automaton_hits(code: str) -> Iterator[int]:
+    """Yield indexes of DANGEROUS_PATTERNS as the automaton finds them in code."""
+    size = len(code)
+    for end, (length, index, is_call) in _AUTOMATON.iter(code):
+        start = end - length + 1
+        if start and _is_word_char(code[start - 1]):
+            continue
+        if is_call:
+            pos = end + 1
+            while pos < size and code[pos].isspace():
+                pos += 1
+            if pos == size or code[pos] != "(":
+                continue
+        yield index
+
 
 def check_dangerous_patterns(code: str) -> Tuple[bool, List[str]]:
     """Check for dangerous patterns in the code."""
-    found_patterns = []
-    
-    for pattern in DANGEROUS_PATTERNS:
-        if re.search(pattern, code):
-            found_patterns.append(pattern)
+    if _AUTOMATON is not None:
+        found = set(_automaton_hits(code))
+    elif not any(literal in code for literal in _DANGER_LITERALS):
+        return True, []
+    else:
+        found = {_match_index(m) for m in _COMBINED_PATTERN.finditer(code)}
+    found_patterns = [DANGEROUS_PATTERNS[i] for i in sorted(found)]
     
     return len(found_patterns) == 0, found_patterns
 
 
+def _first_dangerous_index(code: str) -> Optional[int]:
+    """Index of the first dangerous pattern found in code, stopping the scan there."""
+    if _AUTOMATON is not None:
+        return next(_automaton_hits(code), None)
+    if not any(literal in code for literal in _DANGER_LITERALS):
+        return None
+    match = _COMBINED_PATTERN.search(code)
+    return _match_index(match) if match else None
+
+
+# Nodes that can hold statements; imports are statements, so the import scan
+# never needs to look inside expressions
+_STATEMENT_CONTAINERS = (ast.stmt, ast.excepthandler, ast.match_case)
+
+
+def check_imports(tree: ast.Module) -> Tuple[bool, str]:
+    """Check that every import in the parsed code is from ALLOWED_IMPORTS."""
+    # Depth-first over statements only, in source order
+    stack: List[ast.AST] = list(reversed(tree.body))
+    while stack:
+        node = stack.pop()
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.name.split(".")[0] not in ALLOWED_IMPORTS:
+                    return False, f"Import of '{alias.name}' is not allowed"
+        elif isinstance(node, ast.ImportFrom):
+            module = node.module or ""
+            if node.level or module.split(".")[0] not in ALLOWED_IMPORTS:
+                return False, f"Import from '{'.' * node.level}{module}' is not allowed"
+        else:
+            stack.extend(reversed([
+                child for child in ast.iter_child_nodes(node)
+                if isinstance(child, _STATEMENT_CONTAINERS)
+            ]))
+    
+    return True, ""
+
+
 def check_syntax(code: str) -> Tuple[bool, str]:
     """Check if the code has valid Python syntax."""
     try:
         ast.parse(code)
         return True, ""
     except SyntaxError as e:
-        return False, f"Syntax error at line {e.lineno}: {e.msg}"
+        return False, _syntax_error_message(e)
+
+
+def _syntax_error_message(e: SyntaxError) -> str:
+    return f"Syntax error at line {e.lineno}: {e.msg}"
 
 
 def check_structure(code: str) -> Tuple[bool, str]:
     """Check if the code has the required Manim structure."""
     try:
         tree = ast.parse(code)
+    except Exception as e:
+        return False, f"Error analyzing code structure: {str(e)}"
+    
+    return _check_structure_tree(tree)
+
+
+def _check_structure_tree(tree: ast.Module) -> Tuple[bool, str]:
+    """Check an already-parsed module for the required Manim structure."""
+    try:
+        has_manim_import: bool = False
+        has_scene_class: bool = False
+        has_construct_method: bool = False
         
-        # Check for manim import
-        has_manim_import = False
-        for node in ast.walk(tree):
+        # Imports and the Scene class live at module level, so one pass over
+        # the top-level statements finds both without descending into bodies
+        for node in tree.body:
             if isinstance(node, ast.ImportFrom):
                 if node.module == "manim":
                     has_manim_import = True
-                    break
             elif isinstance(node, ast.Import):
-                for alias in node.names:
-                    if alias.name == "manim":
-                        has_manim_import = True
-                        break
+                if any(alias.name == "manim" for alias in node.names):
+                    has_manim_import = True
+            elif isinstance(node, ast.ClassDef):
+                if any(isinstance(base, ast.Name) and base.id == "Scene" for base in node.bases):
+                    has_scene_class = True
+                    # Check for construct method
+                    if any(
+                        isinstance(item, ast.FunctionDef) and item.name == "construct"
+                        for item in node.body
+                    ):
+                        has_construct_method = True
+            
+            if has_manim_import and has_construct_method:
+                break
         
         if not has_manim_import:
             return False, "Code must import from manim (e.g., 'from manim import *')"
         
-        # Check for Scene class
-        has_scene_class = False
-        has_construct_method = False
-        
-        for node in ast.walk(tree):
-            if isinstance(node, ast.ClassDef):
-                for base in node.bases:
-                    if isinstance(base, ast.Name) and base.id == "Scene":
-                        has_scene_class = True
-                        # Check for construct method
-                        for item in node.body:
-                            if isinstance(item, ast.FunctionDef) and item.name == "construct":
-                                has_construct_method = True
-                                break
-                        break
-        
         if not has_scene_class:
             return False, "Code must define a class that inherits from Scene"
         
@@ -119,22 +243,116 @@ def validate_manim_code(code: str) -> Tuple[bool, str]:
     Returns:
         Tuple of (is_valid, error_message)
     """
+    # Reject oversized input up front (and keep it out of the cache)
+    if code and len(code) > MAX_CODE_LENGTH:
+        return False, f"Code exceeds maximum size of {MAX_CODE_LENGTH} characters"
+    if code and code.count("\n") + (not code.endswith("\n")) > MAX_CODE_LINES:
+        return False, f"Code exceeds maximum of {MAX_CODE_LINES} lines"
+    
+    if not code:
+        return False, "Code is empty"
+    
+    return _validate_cached(code)
+
+
+# Bump when the checks change so verdicts stored by older code are ignored
+VALIDATOR_VERSION = 1
+
+_RULES_FINGERPRINT = repr((
+    VALIDATOR_VERSION, DANGEROUS_PATTERNS, sorted(ALLOWED_IMPORTS),
+    MAX_CODE_LENGTH, MAX_CODE_LINES,
+))
+
+_verdict_db: Optional[sqlite3.Connection] = None
+_verdict_db_lock = threading.Lock()
+
+
+def _verdict_cache() -> Optional[sqlite3.Connection]:
+    """Open the on-disk verdict cache on first use; None when it is disabled."""
+    global _verdict_db
+    path = get_settings().validation_cache_path
+    if not path:
+        return None
+    if _verdict_db is None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA busy_timeout=1000")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS verdicts "
+            "(key TEXT PRIMARY KEY, is_valid INTEGER NOT NULL, error TEXT NOT NULL)"
+        )
+        _verdict_db = conn
+    return _verdict_db
+
+
+def _load_verdict(key: str) -> Optional[Tuple[bool, str]]:
+    try:
+        with _verdict_db_lock:
+            conn = _verdict_cache()
+            if conn is None:
+                return None
+            row = conn.execute(
+                "SELECT is_valid, error FROM verdicts WHERE key = ?", (key,)
+            ).fetchone()
+    except sqlite3.Error:
+        return None  # the cache is an optimization; fall back to validating
+    return (bool(row[0]), row[1]) if row is not None else None
+
+
+def _store_verdict(key: str, verdict: Tuple[bool, str]) -> None:
+    try:
+        with _verdict_db_lock:
+            conn = _verdict_cache()
+            if conn is not None:
+                conn.execute(
+                    "INSERT OR REPLACE INTO verdicts (key, is_valid, error) VALUES (?, ?, ?)",
+                    (key, int(verdict[0]), verdict[1])
+                )
+    except sqlite3.Error:
+        pass
+
+
+@lru_cache(maxsize=256)
+def _validate_cached(code: str) -> Tuple[bool, str]:
+    """
+    Validate with two cache layers: this in-memory LRU, then the on-disk
+    verdict cache keyed by SHA-256 (shared across restarts and workers).
+    """
+    key = hashlib.sha256(
+        (_RULES_FINGERPRINT + code).encode("utf-8", "surrogatepass")
+    ).hexdigest()
+    verdict = _load_verdict(key)
+    if verdict is None:
+        verdict = _validate_impl(code)
+        _store_verdict(key, verdict)
+    return verdict
+
+
+def _validate_impl(code: str) -> Tuple[bool, str]:
+    """Run every check on the source text."""
     # Check for empty code
     if not code or not code.strip():
         return False, "Code is empty"
     
-    # Check syntax
-    is_valid_syntax, syntax_error = check_syntax(code)
-    if not is_valid_syntax:
-        return False, syntax_error
+    # Check syntax (the tree is reused for the structure check)
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        return False, _syntax_error_message(e)
+    
+    # Check for dangerous patterns (the code is rejected on the first one)
+    dangerous_index = _first_dangerous_index(code)
+    if dangerous_index is not None:
+        return False, _DANGER_MESSAGES[dangerous_index]
     
-    # Check for dangerous patterns
-    is_safe, dangerous_patterns = check_dangerous_patterns(code)
-    if not is_safe:
-        return False, f"Code contains dangerous patterns: {', '.join(dangerous_patterns)}"
+    # Check imports against the allowlist
+    imports_allowed, import_error = check_imports(tree)
+    if not imports_allowed:
+        return False, import_error
     
     # Check structure
-    is_valid_structure, structure_error = check_structure(code)
+    is_valid_structure, structure_error = _check_structure_tree(tree)
     if not is_valid_structure:
         return False, structure_error
     
@@ -1,574 +1,376 @@
 """
 LLM Service for generating Manim code using OpenRouter API.
 """
+import asyncio
 import httpx
 import re
-import json
-from typing import Optional
+import hashlib
+import orjson
+import random
+from collections import OrderedDict
+from functools import lru_cache, wraps
+from typing import Iterator, Optional
+
+try:
+    import ahocorasick  # optional: single-pass keyword matching
+except ImportError:
+    ahocorasick = None
+
+try:
+    import h2  # optional: lets the shared client negotiate HTTP/2
+except ImportError:
+    h2 = None
 
 from config import get_settings
-from .code_validator import validate_manim_code
+import database as db
+from .rate_limiter import RequestThrottle, retry_after_seconds
 
 settings = get_settings()
 
 # OpenRouter API endpoint
 OPENROUTER_API_URL = "https://openrouter.ai/api/v1/chat/completions"
 
-# Mock code templates for demo mode (when no API key is set)
-MOCK_CODE_TEMPLATES = {
-    "circle": '''from manim import *
+# Request parameters; they are also part of the LLM cache key
+LLM_PROVIDER = "openrouter"
+LLM_TEMPERATURE = 0.7
+LLM_MAX_TOKENS = 2000
 
-class GeneratedScene(Scene):
-    def construct(self):
-        circle = Circle(color=BLUE, fill_opacity=0.5)
-        self.play(Create(circle))
-        self.wait(0.5)
-        self.play(circle.animate.scale(1.5))
-        self.play(circle.animate.shift(RIGHT * 2))
-        self.play(circle.animate.shift(LEFT * 2))
-        self.wait(1)
-''',
-    "square": '''from manim import *
+# Upper bound on concurrent OpenRouter calls for one multi-scene request
+MULTI_SCENE_CONCURRENCY = 8
 
-class GeneratedScene(Scene):
-    def construct(self):
-        square = Square(color=RED, fill_opacity=0.5)
-        self.play(Create(square))
-        self.wait(0.5)
-        self.play(Rotate(square, PI/2))
-        self.play(square.animate.scale(0.5))
-        self.wait(1)
-''',
-    "triangle": '''from manim import *
+# One pooled client per process so OpenRouter calls reuse warm TLS connections
+_HTTP_LIMITS = httpx.Limits(max_connections=512, max_keepalive_connections=256, keepalive_expiry=60.0)
+_http_client: Optional[httpx.AsyncClient] = None
 
-class GeneratedScene(Scene):
-    def construct(self):
-        triangle = Triangle(color=GREEN, fill_opacity=0.5)
-        self.play(Create(triangle))
-        self.wait(0.5)
-        self.play(Rotate(triangle, PI))
-        self.play(triangle.animate.scale(1.5))
-        self.wait(1)
-''',
-    "transform": '''from manim import *
 
-class GeneratedScene(Scene):
-    def construct(self):
-        circle = Circle(color=BLUE, fill_opacity=0.5)
-        square = Square(color=RED, fill_opacity=0.5)
-        triangle = Triangle(color=GREEN, fill_opacity=0.5)
-        
-        self.play(Create(circle))
-        self.wait(0.5)
-        self.play(Transform(circle, square))
-        self.wait(0.5)
-        self.play(Transform(circle, triangle))
-        self.wait(1)
-''',
-    "pythagorean": '''from manim import *
+def get_http_client() -> httpx.AsyncClient:
+    """Return the process-wide HTTP client, creating it on first use."""
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(timeout=60.0, limits=_HTTP_LIMITS, http2=h2 is not None)
+    return _http_client
 
-class GeneratedScene(Scene):
-    def construct(self):
-        # Title
-        title = Text("Pythagorean Theorem", font_size=36, color=YELLOW)
-        title.to_edge(UP)
-        self.play(Write(title))
-        
-        # Create right triangle
-        triangle = Polygon(
-            ORIGIN, RIGHT * 3, RIGHT * 3 + UP * 2,
-            color=WHITE, fill_opacity=0.3
-        ).shift(LEFT * 1.5 + DOWN * 0.5)
-        
-        self.play(Create(triangle))
-        self.wait(0.5)
-        
-        # Labels
-        a_label = MathTex("a").next_to(triangle, DOWN)
-        b_label = MathTex("b").next_to(triangle, RIGHT)
-        c_label = MathTex("c").move_to(triangle.get_center() + UP * 0.5 + LEFT * 0.5)
-        
-        self.play(Write(a_label), Write(b_label), Write(c_label))
-        self.wait(0.5)
-        
-        # Formula
-        formula = MathTex("a^2 + b^2 = c^2", font_size=48)
-        formula.to_edge(DOWN)
-        self.play(Write(formula))
-        self.wait(2)
-''',
-    "sort": '''from manim import *
 
-class GeneratedScene(Scene):
-    def construct(self):
-        # Title
-        title = Text("Bubble Sort", font_size=36, color=YELLOW)
-        title.to_edge(UP)
-        self.play(Write(title))
-        
-        # Create bars
-        values = [4, 2, 5, 1, 3]
-        bars = VGroup()
-        for i, val in enumerate(values):
-            bar = Rectangle(width=0.6, height=val * 0.5, fill_opacity=0.7, color=BLUE)
-            bar.move_to(RIGHT * (i - 2) * 0.8)
-            bars.add(bar)
-        
-        self.play(Create(bars))
-        self.wait(0.5)
-        
-        # Animate one swap
-        self.play(
-            bars[0].animate.set_color(RED),
-            bars[1].animate.set_color(RED)
-        )
-        self.play(
-            bars[0].animate.shift(RIGHT * 0.8),
-            bars[1].animate.shift(LEFT * 0.8)
-        )
-        self.play(
-            bars[0].animate.set_color(BLUE),
-            bars[1].animate.set_color(BLUE)
+# Client-side budget shared by all OpenRouter calls in this process
+_throttle = RequestThrottle(settings.openrouter_rpm, settings.openrouter_tpm)
+
+
+def _estimate_tokens(messages: list) -> int:
+    """
+    Upper-bound token count for a request: ~4 chars per prompt token plus the
+    completion cap. `messages` are those after the static prompt prefix.
+    """
+    chars = _STATIC_PROMPT_CHARS + sum(len(m["content"]) for m in messages)
+    return chars // 4 + LLM_MAX_TOKENS
+
+
+async def close_http_client() -> None:
+    """Close the process-wide HTTP client."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+@lru_cache(maxsize=None)
+def _get_mock_template(key: str) -> str:
+    """Return a demo-mode template, loading the template module on first use."""
+    from .mock_templates import MOCK_CODE_TEMPLATES
+    return MOCK_CODE_TEMPLATES[key]
+
+
+def __getattr__(name: str):
+    # Keep llm_service.MOCK_CODE_TEMPLATES / MULTI_SCENE_TEMPLATES working
+    # without importing the templates eagerly
+    if name in ("MOCK_CODE_TEMPLATES", "MULTI_SCENE_TEMPLATES"):
+        from . import mock_templates
+        return getattr(mock_templates, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class _KeywordScanner:
+    """
+    Report every keyword from a fixed vocabulary that occurs in a text.
+    
+    The text is scanned once: with an Aho-Corasick automaton when pyahocorasick
+    is installed, otherwise with a lookahead regex that reports every position.
+    Occurrences are reported as plain substrings, with repeats.
+    """
+    
+    def __init__(self, keywords):
+        keywords = sorted(set(keywords), key=len, reverse=True)
+        if ahocorasick is not None:
+            self._automaton = ahocorasick.Automaton()
+            for keyword in keywords:
+                self._automaton.add_word(keyword, keyword)
+            self._automaton.make_automaton()
+        else:
+            self._automaton = None
+            # Longest first so a keyword is not hidden by a shorter one at the same spot
+            self._pattern = re.compile("(?=(" + "|".join(map(re.escape, keywords)) + "))")
+    
+    def iter(self, text: str) -> Iterator[str]:
+        if self._automaton is not None:
+            return (keyword for _, keyword in self._automaton.iter(text))
+        return (m.group(1) for m in self._pattern.finditer(text))
+
+
+class _KeywordMatcher:
+    """
+    Pick the highest-priority key whose keyword occurs anywhere in a text.
+    
+    `table` is ((keyword, key), ...) in priority order, the same order an
+    if/elif cascade of `keyword in text` checks would test them. Matchers for
+    the same kind of text can share one `scanner` (its vocabulary must cover
+    the table) so the keyword search is built once.
+    """
+    
+    def __init__(self, table, scanner: Optional[_KeywordScanner] = None):
+        self._priority = {}
+        self._keys = []
+        for keyword, key in table:
+            self._priority.setdefault(keyword, len(self._keys))
+            self._keys.append(key)
+        self._scanner = scanner or _KeywordScanner(self._priority)
+    
+    def match(self, text: str) -> Optional[str]:
+        priority = self._priority
+        best = min(
+            (priority[keyword] for keyword in self._scanner.iter(text) if keyword in priority),
+            default=None
         )
-        self.wait(1)
-''',
-    "client_server": '''from manim import *
+        return self._keys[best] if best is not None else None
 
-class GeneratedScene(Scene):
-    def construct(self):
-        # Client
-        client_box = Rectangle(width=2, height=1.2, color=BLUE, fill_opacity=0.3)
-        client_label = Text("Client", font_size=24).move_to(client_box)
-        client = VGroup(client_box, client_label).shift(LEFT * 4)
-        
-        # Server
-        server_box = Rectangle(width=2, height=1.2, color=GREEN, fill_opacity=0.3)
-        server_label = Text("Server", font_size=24).move_to(server_box)
-        server = VGroup(server_box, server_label)
-        
-        # Database
-        db_box = Rectangle(width=2, height=1.2, color=PURPLE, fill_opacity=0.3)
-        db_label = Text("Database", font_size=20).move_to(db_box)
-        db = VGroup(db_box, db_label).shift(RIGHT * 4)
-        
-        self.play(Create(client), Create(server), Create(db))
-        self.wait(0.5)
-        
-        # Request arrow
-        arrow1 = Arrow(client.get_right(), server.get_left(), color=YELLOW)
-        req_label = Text("Request", font_size=16, color=YELLOW).next_to(arrow1, UP)
-        self.play(GrowArrow(arrow1), Write(req_label))
-        self.wait(0.3)
-        
-        # Query arrow
-        arrow2 = Arrow(server.get_right(), db.get_left(), color=ORANGE)
-        self.play(GrowArrow(arrow2))
-        self.wait(0.3)
-        
-        # Response arrows
-        arrow3 = Arrow(db.get_left(), server.get_right(), color=TEAL).shift(DOWN * 0.3)
-        arrow4 = Arrow(server.get_left(), client.get_right(), color=TEAL).shift(DOWN * 0.3)
-        resp_label = Text("Response", font_size=16, color=TEAL).next_to(arrow4, DOWN)
-        self.play(GrowArrow(arrow3))
-        self.play(GrowArrow(arrow4), Write(resp_label))
-        self.wait(1)
-''',
-    "neural_network": '''from manim import *
 
-class GeneratedScene(Scene):
-    def construct(self):
-        title = Text("Neural Network", font_size=36, color=YELLOW).to_edge(UP)
-        self.play(Write(title))
-        
-        # Create layers
-        layers = []
-        layer_sizes = [3, 4, 4, 2]  # Input, hidden, hidden, output
-        
-        for l, size in enumerate(layer_sizes):
-            layer = VGroup()
-            for i in range(size):
-                neuron = Circle(radius=0.2, color=BLUE, fill_opacity=0.5)
-                neuron.move_to(RIGHT * (l - 1.5) * 2 + UP * (i - (size-1)/2) * 0.8)
-                layer.add(neuron)
-            layers.append(layer)
-        
-        all_neurons = VGroup(*[n for layer in layers for n in layer])
-        self.play(Create(all_neurons))
-        self.wait(0.5)
-        
-        # Animate activation flowing through
-        for layer in layers:
-            self.play(*[n.animate.set_color(GREEN) for n in layer], run_time=0.5)
-        self.wait(1)
-''',
-    "formula": '''from manim import *
+# Prompt keyword -> MOCK_CODE_TEMPLATES key, in priority order
+_MOCK_KEYWORD_TABLE = (
+    ("pythagorean", "pythagorean"),
+    ("theorem", "pythagorean"),
+    ("sort", "sort"),
+    ("bubble", "sort"),
+    ("algorithm", "sort"),
+    ("client", "client_server"),
+    ("server", "client_server"),
+    ("database", "client_server"),
+    ("request", "client_server"),
+    ("neural", "neural_network"),
+    ("network", "neural_network"),
+    ("ai", "neural_network"),
+    ("machine learning", "neural_network"),
+    ("formula", "formula"),
+    ("equation", "formula"),
+    ("quadratic", "formula"),
+    ("euler", "formula"),
+    ("transform", "transform"),
+    ("morph", "transform"),
+    ("change", "transform"),
+    ("triangle", "triangle"),
+    ("circle", "circle"),
+    ("square", "square"),
+    ("rectangle", "square"),
+)
 
-class GeneratedScene(Scene):
-    def construct(self):
-        title = Text("Mathematical Formulas", font_size=36, color=YELLOW)
-        title.to_edge(UP)
-        self.play(Write(title))
-        self.wait(0.5)
-        
-        # Quadratic formula
-        quad = MathTex(r"x = \\frac{-b \\pm \\sqrt{b^2 - 4ac}}{2a}")
-        quad.shift(UP)
-        
-        # Euler's identity
-        euler = MathTex(r"e^{i\\pi} + 1 = 0")
-        
-        # Pythagorean
-        pyth = MathTex(r"a^2 + b^2 = c^2")
-        pyth.shift(DOWN)
-        
-        self.play(Write(quad))
-        self.wait(0.5)
-        self.play(Write(euler))
-        self.wait(0.5)
-        self.play(Write(pyth))
-        self.wait(2)
-''',
-    "default": '''from manim import *
+# Prompt keyword -> _TOPIC_SCENES key, in priority order
+_TOPIC_KEYWORD_TABLE = (
+    ("sort", "sort"),
+    ("bubble", "sort"),
+    ("binary search", "search"),
+    ("search", "search"),
+    ("neural", "neural_network"),
+    ("network", "neural_network"),
+    ("deep learning", "neural_network"),
+    ("pythagorean", "pythagorean"),
+    ("theorem", "pythagorean"),
+    ("client", "client_server"),
+    ("server", "client_server"),
+    ("api", "client_server"),
+    ("recursion", "recursion"),
+    ("fibonacci", "recursion"),
+    ("tree", "tree"),
+    ("binary tree", "tree"),
+    ("stack", "stack"),
+    ("queue", "queue"),
+    ("graph", "graph"),
+    ("bfs", "graph"),
+    ("dfs", "graph"),
+    ("array", "array"),
+    ("list", "array"),
+)
 
-class GeneratedScene(Scene):
-    def construct(self):
-        # Welcome text
-        title = Text("Manim Animation", font_size=48, color=BLUE)
-        self.play(Write(title))
-        self.wait(0.5)
-        
-        # Transform to shapes
-        self.play(title.animate.scale(0.5).to_edge(UP))
-        
-        # Create shapes
-        circle = Circle(color=RED, fill_opacity=0.5).shift(LEFT * 2)
-        square = Square(color=GREEN, fill_opacity=0.5)
-        triangle = Triangle(color=BLUE, fill_opacity=0.5).shift(RIGHT * 2)
-        
-        shapes = VGroup(circle, square, triangle)
-        self.play(Create(shapes))
-        self.wait(0.5)
-        
-        # Animate
-        self.play(Rotate(shapes, PI/4))
-        self.play(shapes.animate.shift(UP))
-        self.play(shapes.animate.shift(DOWN))
-        self.wait(1)
-'''
-}
+# Both demo-mode lookups read the same lowercased prompts, so they share one scanner
+_PROMPT_SCANNER = _KeywordScanner(
+    keyword for keyword, _ in _MOCK_KEYWORD_TABLE + _TOPIC_KEYWORD_TABLE
+)
+_MOCK_KEYWORDS = _KeywordMatcher(_MOCK_KEYWORD_TABLE, _PROMPT_SCANNER)
+_TOPIC_KEYWORDS = _KeywordMatcher(_TOPIC_KEYWORD_TABLE, _PROMPT_SCANNER)
 
+
+@lru_cache(maxsize=1024)
 def get_mock_code(prompt: str) -> str:
     """Return mock code based on prompt keywords."""
-    prompt_lower = prompt.lower()
-    
-    # Check for specific keywords
-    if "pythagorean" in prompt_lower or "theorem" in prompt_lower:
-        return MOCK_CODE_TEMPLATES["pythagorean"]
-    elif "sort" in prompt_lower or "bubble" in prompt_lower or "algorithm" in prompt_lower:
-        return MOCK_CODE_TEMPLATES["sort"]
-    elif "client" in prompt_lower or "server" in prompt_lower or "database" in prompt_lower or "request" in prompt_lower:
-        return MOCK_CODE_TEMPLATES["client_server"]
-    elif "neural" in prompt_lower or "network" in prompt_lower or "ai" in prompt_lower or "machine learning" in prompt_lower:
-        return MOCK_CODE_TEMPLATES["neural_network"]
-    elif "formula" in prompt_lower or "equation" in prompt_lower or "quadratic" in prompt_lower or "euler" in prompt_lower:
-        return MOCK_CODE_TEMPLATES["formula"]
-    elif "transform" in prompt_lower or "morph" in prompt_lower or "change" in prompt_lower:
-        return MOCK_CODE_TEMPLATES["transform"]
-    elif "triangle" in prompt_lower:
-        return MOCK_CODE_TEMPLATES["triangle"]
-    elif "circle" in prompt_lower:
-        return MOCK_CODE_TEMPLATES["circle"]
-    elif "square" in prompt_lower or "rectangle" in prompt_lower:
-        return MOCK_CODE_TEMPLATES["square"]
-    
-    return MOCK_CODE_TEMPLATES["default"]
+    return _get_mock_template(_MOCK_KEYWORDS.match(prompt.lower()) or "default")
 
 
-# Multi-scene templates for creating 30-second videos (5-6 scenes @ ~5 seconds each)
-MULTI_SCENE_TEMPLATES = {
-    "intro": '''from manim import *
+# Scene breakdowns for the demo-mode topics (shared by every call, never mutated)
+_SORT_SCENES = (
+    ("Introduction", "Title: Bubble Sort Algorithm - How it works"),
+    ("Unsorted Array", "Show initial unsorted array of numbers"),
+    ("Compare & Swap", "Demonstrate comparing adjacent elements and swapping"),
+    ("Multiple Passes", "Show multiple passes through the array"),
+    ("Sorted Result", "Show final sorted array with summary")
+)
 
-class GeneratedScene(Scene):
-    def construct(self):
-        # Intro scene with title
-        title = Text("{title}", font_size=56, color=BLUE)
-        subtitle = Text("{subtitle}", font_size=28, color=GRAY).next_to(title, DOWN)
-        
-        self.play(Write(title), run_time=1.5)
-        self.play(FadeIn(subtitle), run_time=0.5)
-        self.wait(1.5)
-        self.play(FadeOut(title), FadeOut(subtitle))
-        self.wait(0.5)
-''',
-    "concept1": '''from manim import *
+_SEARCH_SCENES = (
+    ("Introduction", "Title: Binary Search - Efficient searching"),
+    ("Sorted Array", "Show a sorted array we'll search in"),
+    ("Find Middle", "Highlight the middle element"),
+    ("Compare & Narrow", "Compare target with middle, narrow search range"),
+    ("Found Target", "Show successful search with complexity O(log n)")
+)
 
-class GeneratedScene(Scene):
-    def construct(self):
-        # First concept visualization
-        header = Text("Step 1", font_size=32, color=YELLOW).to_edge(UP)
-        self.play(Write(header))
-        
-        shape = Circle(color=BLUE, fill_opacity=0.6)
-        label = Text("Core Concept", font_size=24).next_to(shape, DOWN)
-        
-        self.play(Create(shape))
-        self.play(Write(label))
-        self.wait(0.5)
-        self.play(shape.animate.scale(1.3))
-        self.wait(1)
-        self.play(FadeOut(shape), FadeOut(label), FadeOut(header))
-''',
-    "concept2": '''from manim import *
+_NEURAL_NETWORK_SCENES = (
+    ("Introduction", "Title: Neural Networks Explained"),
+    ("Input Layer", "Show input neurons receiving data"),
+    ("Hidden Layers", "Visualize hidden layer processing"),
+    ("Weights & Connections", "Animate data flowing through connections"),
+    ("Output Layer", "Show final output and prediction")
+)
 
-class GeneratedScene(Scene):
-    def construct(self):
-        # Second concept - transformation
-        header = Text("Step 2", font_size=32, color=YELLOW).to_edge(UP)
-        self.play(Write(header))
-        
-        circle = Circle(color=BLUE, fill_opacity=0.5)
-        square = Square(color=RED, fill_opacity=0.5)
-        triangle = Triangle(color=GREEN, fill_opacity=0.5)
-        
-        self.play(Create(circle))
-        self.wait(0.3)
-        self.play(Transform(circle, square))
-        self.wait(0.3)
-        self.play(Transform(circle, triangle))
-        self.wait(0.5)
-        self.play(FadeOut(circle), FadeOut(header))
-''',
-    "concept3": '''from manim import *
+_PYTHAGOREAN_SCENES = (
+    ("Introduction", "Title: The Pythagorean Theorem"),
+    ("Right Triangle", "Draw a right triangle with sides a, b, c"),
+    ("Squares on Sides", "Draw squares on each side of the triangle"),
+    ("Area Comparison", "Show a² + b² = c² visually"),
+    ("Formula", "Display the famous equation")
+)
 
-class GeneratedScene(Scene):
-    def construct(self):
-        # Third concept - movement and grouping
-        header = Text("Step 3", font_size=32, color=YELLOW).to_edge(UP)
-        self.play(Write(header))
-        
-        shapes = VGroup(
-            Circle(color=RED, fill_opacity=0.5).shift(LEFT * 2),
-            Square(color=GREEN, fill_opacity=0.5),
-            Triangle(color=BLUE, fill_opacity=0.5).shift(RIGHT * 2)
-        )
-        
-        self.play(Create(shapes))
-        self.wait(0.3)
-        self.play(Rotate(shapes, PI/2))
-        self.play(shapes.animate.arrange(DOWN))
-        self.wait(0.5)
-        self.play(FadeOut(shapes), FadeOut(header))
-''',
-    "diagram": '''from manim import *
+_CLIENT_SERVER_SCENES = (
+    ("Introduction", "Title: Client-Server Architecture"),
+    ("The Client", "Show client making a request"),
+    ("The Server", "Server receives and processes request"),
+    ("Database Query", "Server queries the database"),
+    ("Response Flow", "Data flows back to client")
+)
 
-class GeneratedScene(Scene):
-    def construct(self):
-        # Diagram scene with connections
-        header = Text("Architecture", font_size=32, color=YELLOW).to_edge(UP)
-        self.play(Write(header))
-        
-        # Create boxes
-        box1 = VGroup(
-            Rectangle(width=1.8, height=1, color=BLUE, fill_opacity=0.3),
-            Text("A", font_size=20)
-        ).shift(LEFT * 3)
-        
-        box2 = VGroup(
-            Rectangle(width=1.8, height=1, color=GREEN, fill_opacity=0.3),
-            Text("B", font_size=20)
-        )
-        
-        box3 = VGroup(
-            Rectangle(width=1.8, height=1, color=PURPLE, fill_opacity=0.3),
-            Text("C", font_size=20)
-        ).shift(RIGHT * 3)
-        
-        self.play(Create(box1), Create(box2), Create(box3))
-        
-        arrow1 = Arrow(box1.get_right(), box2.get_left(), color=YELLOW)
-        arrow2 = Arrow(box2.get_right(), box3.get_left(), color=YELLOW)
-        
-        self.play(GrowArrow(arrow1), GrowArrow(arrow2))
-        self.wait(1.5)
-        self.play(FadeOut(VGroup(box1, box2, box3, arrow1, arrow2, header)))
-''',
-    "summary": '''from manim import *
+_RECURSION_SCENES = (
+    ("Introduction", "Title: Recursion & Fibonacci"),
+    ("Base Case", "Show the base case F(0)=0, F(1)=1"),
+    ("Recursive Call", "Visualize function calling itself"),
+    ("Call Stack", "Show the call stack building up"),
+    ("Result", "Show final computed value")
+)
 
-class GeneratedScene(Scene):
-    def construct(self):
-        # Summary/conclusion scene
-        header = Text("Summary", font_size=36, color=YELLOW)
-        header.to_edge(UP)
-        self.play(Write(header))
-        
-        points = VGroup(
-            Text("✓ Concept 1: Visualization", font_size=24, color=GREEN),
-            Text("✓ Concept 2: Transformation", font_size=24, color=GREEN),
-            Text("✓ Concept 3: Animation", font_size=24, color=GREEN),
-        ).arrange(DOWN, aligned_edge=LEFT, buff=0.4)
-        
-        for point in points:
-            self.play(Write(point), run_time=0.6)
-            self.wait(0.3)
-        
-        self.wait(1)
-        self.play(FadeOut(points), FadeOut(header))
-''',
-    "outro": '''from manim import *
+_TREE_SCENES = (
+    ("Introduction", "Title: Binary Tree Data Structure"),
+    ("Root Node", "Create and show the root node"),
+    ("Adding Children", "Add left and right children"),
+    ("Tree Traversal", "Show in-order, pre-order traversal"),
+    ("Complete Tree", "Display the full tree structure")
+)
 
-class GeneratedScene(Scene):
-    def construct(self):
-        # Outro with thank you
-        thanks = Text("Thank You!", font_size=56, color=BLUE)
-        
-        self.play(Write(thanks))
-        self.wait(0.5)
-        
-        # Animate with colors
-        self.play(thanks.animate.set_color(RED))
-        self.play(thanks.animate.set_color(GREEN))
-        self.play(thanks.animate.set_color(BLUE))
-        
-        self.wait(1)
-        self.play(FadeOut(thanks))
-'''
+_STACK_SCENES = (
+    ("Introduction", "Title: Stack (LIFO) Data Structure"),
+    ("Empty Structure", "Show empty stack/queue"),
+    ("Push/Enqueue", "Add elements to the structure"),
+    ("Pop/Dequeue", "Remove elements showing order"),
+    ("Use Cases", "Show common applications")
+)
+
+_QUEUE_SCENES = (
+    ("Introduction", "Title: Queue (FIFO) Data Structure"),
+    ("Empty Structure", "Show empty stack/queue"),
+    ("Push/Enqueue", "Add elements to the structure"),
+    ("Pop/Dequeue", "Remove elements showing order"),
+    ("Use Cases", "Show common applications")
+)
+
+_GRAPH_SCENES = (
+    ("Introduction", "Title: Graph Traversal Algorithms"),
+    ("Create Graph", "Show nodes and edges"),
+    ("Start Node", "Highlight the starting node"),
+    ("Traversal Steps", "Animate visiting each node"),
+    ("Visited All", "Show complete traversal path")
+)
+
+_ARRAY_SCENES = (
+    ("Introduction", "Title: Arrays and Lists"),
+    ("Create Array", "Show array with indices"),
+    ("Access Element", "Highlight accessing by index O(1)"),
+    ("Insert/Delete", "Show insert and delete operations"),
+    ("Summary", "Compare time complexities")
+)
+
+_TOPIC_SCENES = {
+    "sort": _SORT_SCENES,
+    "search": _SEARCH_SCENES,
+    "neural_network": _NEURAL_NETWORK_SCENES,
+    "pythagorean": _PYTHAGOREAN_SCENES,
+    "client_server": _CLIENT_SERVER_SCENES,
+    "recursion": _RECURSION_SCENES,
+    "tree": _TREE_SCENES,
+    "stack": _STACK_SCENES,
+    "queue": _QUEUE_SCENES,
+    "graph": _GRAPH_SCENES,
+    "array": _ARRAY_SCENES,
 }
 
+# Filler words skipped when naming a generic topic
+_STOPWORDS = frozenset({
+    'the', 'and', 'for', 'with', 'how', 'what', 'why', 'show', 'explain',
+    'create', 'make', 'visualize', 'animate', 'demonstrate',
+})
+
 
-def split_topic_into_scenes(prompt: str) -> list:
+@lru_cache(maxsize=1024)
+def split_topic_into_scenes(prompt: str) -> tuple:
     """
     Intelligently split a topic/prompt into logical scene parts.
-    Returns list of (scene_title, scene_description) tuples.
+    Returns a tuple of (scene_title, scene_description) tuples (memoized,
+    so it must not be mutated).
     """
-    prompt_lower = prompt.lower()
-    
-    # Common topic patterns and their scene breakdowns
-    if "sort" in prompt_lower or "bubble" in prompt_lower:
-        return [
-            ("Introduction", "Title: Bubble Sort Algorithm - How it works"),
-            ("Unsorted Array", "Show initial unsorted array of numbers"),
-            ("Compare & Swap", "Demonstrate comparing adjacent elements and swapping"),
-            ("Multiple Passes", "Show multiple passes through the array"),
-            ("Sorted Result", "Show final sorted array with summary")
-        ]
-    
-    elif "binary search" in prompt_lower or "search" in prompt_lower:
-        return [
-            ("Introduction", "Title: Binary Search - Efficient searching"),
-            ("Sorted Array", "Show a sorted array we'll search in"),
-            ("Find Middle", "Highlight the middle element"),
-            ("Compare & Narrow", "Compare target with middle, narrow search range"),
-            ("Found Target", "Show successful search with complexity O(log n)")
-        ]
-    
-    elif "neural" in prompt_lower or "network" in prompt_lower or "deep learning" in prompt_lower:
-        return [
-            ("Introduction", "Title: Neural Networks Explained"),
-            ("Input Layer", "Show input neurons receiving data"),
-            ("Hidden Layers", "Visualize hidden layer processing"),
-            ("Weights & Connections", "Animate data flowing through connections"),
-            ("Output Layer", "Show final output and prediction")
-        ]
+    scenes = _TOPIC_SCENES.get(_TOPIC_KEYWORDS.match(prompt.lower()))
+    if scenes is not None:
+        return scenes
     
-    elif "pythagorean" in prompt_lower or "theorem" in prompt_lower:
-        return [
-            ("Introduction", "Title: The Pythagorean Theorem"),
-            ("Right Triangle", "Draw a right triangle with sides a, b, c"),
-            ("Squares on Sides", "Draw squares on each side of the triangle"),
-            ("Area Comparison", "Show a² + b² = c² visually"),
-            ("Formula", "Display the famous equation")
-        ]
-    
-    elif "client" in prompt_lower or "server" in prompt_lower or "api" in prompt_lower:
-        return [
-            ("Introduction", "Title: Client-Server Architecture"),
-            ("The Client", "Show client making a request"),
-            ("The Server", "Server receives and processes request"),
-            ("Database Query", "Server queries the database"),
-            ("Response Flow", "Data flows back to client")
-        ]
+    # Generic topic splitting - extract key concepts from prompt
+    words = [w for w in prompt.split() if len(w) > 3 and w.lower() not in _STOPWORDS]
+    topic = " ".join(words[:4]).title() if words else "Animation"
     
-    elif "recursion" in prompt_lower or "fibonacci" in prompt_lower:
-        return [
-            ("Introduction", "Title: Recursion & Fibonacci"),
-            ("Base Case", "Show the base case F(0)=0, F(1)=1"),
-            ("Recursive Call", "Visualize function calling itself"),
-            ("Call Stack", "Show the call stack building up"),
-            ("Result", "Show final computed value")
-        ]
-    
-    elif "tree" in prompt_lower or "binary tree" in prompt_lower:
-        return [
-            ("Introduction", "Title: Binary Tree Data Structure"),
-            ("Root Node", "Create and show the root node"),
-            ("Adding Children", "Add left and right children"),
-            ("Tree Traversal", "Show in-order, pre-order traversal"),
-            ("Complete Tree", "Display the full tree structure")
-        ]
-    
-    elif "stack" in prompt_lower or "queue" in prompt_lower:
-        return [
-            ("Introduction", f"Title: {'Stack (LIFO)' if 'stack' in prompt_lower else 'Queue (FIFO)'} Data Structure"),
-            ("Empty Structure", "Show empty stack/queue"),
-            ("Push/Enqueue", "Add elements to the structure"),
-            ("Pop/Dequeue", "Remove elements showing order"),
-            ("Use Cases", "Show common applications")
-        ]
-    
-    elif "graph" in prompt_lower or "bfs" in prompt_lower or "dfs" in prompt_lower:
-        return [
-            ("Introduction", "Title: Graph Traversal Algorithms"),
-            ("Create Graph", "Show nodes and edges"),
-            ("Start Node", "Highlight the starting node"),
-            ("Traversal Steps", "Animate visiting each node"),
-            ("Visited All", "Show complete traversal path")
-        ]
-    
-    elif "array" in prompt_lower or "list" in prompt_lower:
-        return [
-            ("Introduction", "Title: Arrays and Lists"),
-            ("Create Array", "Show array with indices"),
-            ("Access Element", "Highlight accessing by index O(1)"),
-            ("Insert/Delete", "Show insert and delete operations"),
-            ("Summary", "Compare time complexities")
-        ]
-    
-    else:
-        # Generic topic splitting - extract key concepts from prompt
-        words = [w for w in prompt.split() if len(w) > 3 and w.lower() not in ['the', 'and', 'for', 'with', 'how', 'what', 'why', 'show', 'explain', 'create', 'make', 'visualize', 'animate', 'demonstrate']]
-        topic = " ".join(words[:4]).title() if words else "Animation"
-        
-        return [
-            ("Introduction", f"Title: {topic}"),
-            ("Core Concept", f"Explain the main idea of {topic}"),
-            ("Visualization", f"Visual demonstration of {topic}"),
-            ("Details", f"Additional details and examples"),
-            ("Summary", f"Recap of {topic} with key points")
-        ]
+    return (
+        ("Introduction", f"Title: {topic}"),
+        ("Core Concept", f"Explain the main idea of {topic}"),
+        ("Visualization", f"Visual demonstration of {topic}"),
+        ("Details", f"Additional details and examples"),
+        ("Summary", f"Recap of {topic} with key points")
+    )
 
 
-def generate_scene_code_for_part(scene_title: str, scene_description: str, scene_index: int, total_scenes: int) -> str:
+class _SceneTemplate:
     """
-    Generate Manim code for a specific scene part.
-    Creates unique animations based on the scene's role in the video.
+    Code template with $name placeholders, split into chunks once at import.
+    
+    substitute() only drops the values into their slots and joins the chunks,
+    instead of re-scanning the text with a regex on every call.
     """
-    title_clean = scene_title.replace("'", "\\'").replace('"', '\\"')
-    desc_clean = scene_description.replace("'", "\\'").replace('"', '\\"')
     
-    # Different templates based on scene position and type
-    if scene_index == 0:  # Intro
-        # Extract title from description
-        if "Title:" in scene_description:
-            main_title = scene_description.split("Title:")[-1].strip()
-        else:
-            main_title = scene_title
-        
-        return f'''from manim import *
+    def __init__(self, text: str):
+        # Even indices are literal text, odd indices are placeholder names
+        self._chunks = re.split(r"\$([a-z_]+)", text)
+        self._slots = range(1, len(self._chunks), 2)
+    
+    def substitute(self, **values: str) -> str:
+        chunks = self._chunks.copy()
+        for i in self._slots:
+            chunks[i] = values[chunks[i]]
+        return "".join(chunks)
+
+
+# Scene templates for generate_scene_code_for_part, split once at import
+_INTRO_SCENE = _SceneTemplate('''from manim import *
 
 class GeneratedScene(Scene):
     def construct(self):
         # Intro scene
-        title = Text("{main_title}", font_size=48, color=BLUE)
+        title = Text("$main_title", font_size=48, color=BLUE)
         
         self.play(Write(title), run_time=1.5)
         self.wait(1)
@@ -582,10 +384,9 @@ class GeneratedScene(Scene):
         self.wait(1.5)
         
         self.play(FadeOut(title), FadeOut(subtitle))
-'''
-    
-    elif scene_index == total_scenes - 1:  # Outro/Summary
-        return f'''from manim import *
+''')
+
+_SUMMARY_SCENE = '''from manim import *
 
 class GeneratedScene(Scene):
     def construct(self):
@@ -611,14 +412,13 @@ class GeneratedScene(Scene):
         self.play(Write(thanks))
         self.wait(1.5)
 '''
-    
-    elif "array" in scene_description.lower() or "unsorted" in scene_description.lower():
-        return f'''from manim import *
+
+_ARRAY_SCENE = _SceneTemplate('''from manim import *
 
 class GeneratedScene(Scene):
     def construct(self):
-        # {scene_title}: Array visualization
-        header = Text("{title_clean}", font_size=32, color=YELLOW).to_edge(UP)
+        # $title_clean: Array visualization
+        header = Text("$title_clean", font_size=32, color=YELLOW).to_edge(UP)
         self.play(Write(header))
         
         # Create array boxes
@@ -642,15 +442,14 @@ class GeneratedScene(Scene):
         
         self.wait(1)
         self.play(FadeOut(boxes), FadeOut(header))
-'''
-    
-    elif "compare" in scene_description.lower() or "swap" in scene_description.lower():
-        return f'''from manim import *
+''')
+
+_COMPARE_SWAP_SCENE = _SceneTemplate('''from manim import *
 
 class GeneratedScene(Scene):
     def construct(self):
-        # {scene_title}: Compare and Swap
-        header = Text("{title_clean}", font_size=32, color=YELLOW).to_edge(UP)
+        # $title_clean: Compare and Swap
+        header = Text("$title_clean", font_size=32, color=YELLOW).to_edge(UP)
         self.play(Write(header))
         
         # Two elements to compare
@@ -683,15 +482,14 @@ class GeneratedScene(Scene):
         self.play(box1[0].animate.set_color(GREEN), box2[0].animate.set_color(GREEN))
         self.wait(1)
         self.play(FadeOut(VGroup(box1, box2, compare, header)))
-'''
-    
-    elif "node" in scene_description.lower() or "layer" in scene_description.lower():
-        return f'''from manim import *
+''')
+
+_NODE_LAYER_SCENE = _SceneTemplate('''from manim import *
 
 class GeneratedScene(Scene):
     def construct(self):
-        # {scene_title}: Node/Layer visualization
-        header = Text("{title_clean}", font_size=32, color=YELLOW).to_edge(UP)
+        # $title_clean: Node/Layer visualization
+        header = Text("$title_clean", font_size=32, color=YELLOW).to_edge(UP)
         self.play(Write(header))
         
         # Create nodes in a layer
@@ -712,15 +510,14 @@ class GeneratedScene(Scene):
         self.play(Write(label))
         self.wait(1)
         self.play(FadeOut(VGroup(nodes, label, header)))
-'''
-    
-    elif "triangle" in scene_description.lower() or "geometry" in scene_description.lower():
-        return f'''from manim import *
+''')
+
+_GEOMETRY_SCENE = _SceneTemplate('''from manim import *
 
 class GeneratedScene(Scene):
     def construct(self):
-        # {scene_title}: Geometry
-        header = Text("{title_clean}", font_size=32, color=YELLOW).to_edge(UP)
+        # $title_clean: Geometry
+        header = Text("$title_clean", font_size=32, color=YELLOW).to_edge(UP)
         self.play(Write(header))
         
         # Right triangle
@@ -739,15 +536,14 @@ class GeneratedScene(Scene):
         self.play(Write(a), Write(b), Write(c))
         self.wait(1.5)
         self.play(FadeOut(VGroup(triangle, a, b, c, header)))
-'''
-    
-    elif "flow" in scene_description.lower() or "request" in scene_description.lower() or "response" in scene_description.lower():
-        return f'''from manim import *
+''')
+
+_DATA_FLOW_SCENE = _SceneTemplate('''from manim import *
 
 class GeneratedScene(Scene):
     def construct(self):
-        # {scene_title}: Data flow
-        header = Text("{title_clean}", font_size=32, color=YELLOW).to_edge(UP)
+        # $title_clean: Data flow
+        header = Text("$title_clean", font_size=32, color=YELLOW).to_edge(UP)
         self.play(Write(header))
         
         # Source and destination
@@ -773,31 +569,26 @@ class GeneratedScene(Scene):
         
         self.wait(0.5)
         self.play(FadeOut(VGroup(source, dest, arrow, header)))
-'''
-    
-    else:
-        # Default scene with shapes and animation
-        colors = ["BLUE", "RED", "GREEN", "PURPLE", "ORANGE"]
-        color = colors[scene_index % len(colors)]
-        
-        return f'''from manim import *
+''')
+
+_DEFAULT_SCENE = _SceneTemplate('''from manim import *
 
 class GeneratedScene(Scene):
     def construct(self):
-        # {scene_title}
-        header = Text("{title_clean}", font_size=32, color=YELLOW).to_edge(UP)
+        # $title_clean
+        header = Text("$title_clean", font_size=32, color=YELLOW).to_edge(UP)
         self.play(Write(header))
         
         # Main content
-        main_text = Text("{desc_clean[:50]}...", font_size=24) if len("{desc_clean}") > 50 else Text("{desc_clean}", font_size=24)
+        main_text = Text("$main_text", font_size=24)
         main_text.shift(UP * 0.5)
         self.play(Write(main_text))
         
         # Decorative shapes
         shapes = VGroup(
-            Circle(radius=0.5, color={color}, fill_opacity=0.5).shift(LEFT * 2 + DOWN),
-            Square(side_length=0.8, color={color}, fill_opacity=0.5).shift(DOWN),
-            Triangle(color={color}, fill_opacity=0.5).scale(0.5).shift(RIGHT * 2 + DOWN)
+            Circle(radius=0.5, color=$color, fill_opacity=0.5).shift(LEFT * 2 + DOWN),
+            Square(side_length=0.8, color=$color, fill_opacity=0.5).shift(DOWN),
+            Triangle(color=$color, fill_opacity=0.5).scale(0.5).shift(RIGHT * 2 + DOWN)
         )
         
         self.play(Create(shapes))
@@ -805,10 +596,84 @@ class GeneratedScene(Scene):
         self.play(Rotate(shapes, PI/4))
         self.wait(1)
         self.play(FadeOut(VGroup(header, main_text, shapes)))
-'''
+''')
+
+def _escape_literal(text: str) -> str:
+    """Escape text for a double-quoted Python string literal (quotes, backslashes, newlines, controls)."""
+    # JSON string escapes are a subset of Python's, and orjson does it in one C pass
+    return orjson.dumps(text)[1:-1].decode()
+
+
+# Middle-scene templates, picked by the first matching description keyword below
+_SCENE_TEMPLATES = {
+    "array": _ARRAY_SCENE,
+    "compare_swap": _COMPARE_SWAP_SCENE,
+    "node_layer": _NODE_LAYER_SCENE,
+    "geometry": _GEOMETRY_SCENE,
+    "data_flow": _DATA_FLOW_SCENE,
+}
+
+# Description keyword -> _SCENE_TEMPLATES key, in priority order
+_SCENE_KEYWORDS = _KeywordMatcher((
+    ("array", "array"),
+    ("unsorted", "array"),
+    ("compare", "compare_swap"),
+    ("swap", "compare_swap"),
+    ("node", "node_layer"),
+    ("layer", "node_layer"),
+    ("triangle", "geometry"),
+    ("geometry", "geometry"),
+    ("flow", "data_flow"),
+    ("request", "data_flow"),
+    ("response", "data_flow"),
+))
+
+
+@lru_cache(maxsize=1024)
+def generate_scene_code_for_part(scene_title: str, scene_description: str, scene_index: int, total_scenes: int) -> str:
+    """
+    Generate Manim code for a specific scene part.
+    Creates unique animations based on the scene's role in the video.
+    """
+    title_clean = _escape_literal(scene_title)
+    
+    # Different templates based on scene position and type
+    if scene_index == 0:  # Intro
+        # Extract title from description
+        if "Title:" in scene_description:
+            main_title = scene_description.split("Title:")[-1].strip()
+        else:
+            main_title = scene_title
+        
+        return _INTRO_SCENE.substitute(main_title=_escape_literal(main_title))
+    
+    elif scene_index == total_scenes - 1:  # Outro/Summary
+        return _SUMMARY_SCENE
+    
+    else:
+        template = _SCENE_TEMPLATES.get(_SCENE_KEYWORDS.match(scene_description.lower()))
+        if template is not None:
+            return template.substitute(title_clean=title_clean)
+        
+        # Default scene with shapes and animation; truncate before escaping
+        # so the cut never lands inside an escape sequence
+        if len(scene_description) > 50:
+            desc_clean = _escape_literal(scene_description[:50] + "...")
+        else:
+            desc_clean = _escape_literal(scene_description)
+        
+        colors = ["BLUE", "RED", "GREEN", "PURPLE", "ORANGE"]
+        color = colors[scene_index % len(colors)]
+        
+        return _DEFAULT_SCENE.substitute(
+            title_clean=title_clean,
+            main_text=desc_clean,
+            color=color
+        )
 
 
-def get_multi_scene_codes(prompt: str, num_scenes: int = 5) -> list:
+@lru_cache(maxsize=1024)
+def get_multi_scene_codes(prompt: str, num_scenes: int = 5) -> tuple:
     """
     Generate multiple scene codes from a single prompt.
     Intelligently splits the topic into logical parts and generates unique code for each.
@@ -818,18 +683,17 @@ def get_multi_scene_codes(prompt: str, num_scenes: int = 5) -> list:
         num_scenes: Number of scenes to generate (default 5)
     
     Returns:
-        List of tuples: [(scene_prompt, scene_code), ...]
+        Tuple of tuples: ((scene_prompt, scene_code), ...), memoized per
+        (prompt, num_scenes)
     """
     # Split the topic into logical scene parts
     scene_parts = split_topic_into_scenes(prompt)[:num_scenes]
     
     # Generate code for each scene
-    scenes = []
-    for i, (title, description) in enumerate(scene_parts):
-        code = generate_scene_code_for_part(title, description, i, len(scene_parts))
-        scenes.append((title, code))
-    
-    return scenes
+    return tuple(
+        (title, generate_scene_code_for_part(title, description, i, len(scene_parts)))
+        for i, (title, description) in enumerate(scene_parts)
+    )
 
 
 SYSTEM_PROMPT = """You are an expert Manim animation code generator. Your task is to generate Python code using the Manim library (Community Edition) to create mathematical and technical animations.
@@ -939,20 +803,132 @@ class GeneratedScene(Scene):
 ]
 
 
+# First fenced code block; the lazy body stops at the nearest closing fence
+_CODE_BLOCK_RE = re.compile(r"```(?:python)?\s*(.*?)```", re.DOTALL)
+
+
 def extract_code(response_text: str) -> str:
     """Extract Python code from LLM response."""
-    # Try to find code blocks
-    code_block_pattern = r"```(?:python)?\s*(.*?)```"
-    matches = re.findall(code_block_pattern, response_text, re.DOTALL)
-    
-    if matches:
-        return matches[0].strip()
+    # Try to find a code block; if there is none, assume the entire response is code
+    match = _CODE_BLOCK_RE.search(response_text)
+    return (match.group(1) if match else response_text).strip()
+
+
+# Bump to orphan every cached response (e.g. after changing extract_code)
+LLM_CACHE_VERSION = 2
+
+# In-process LRU in front of the llm_cache table
+LLM_MEMORY_CACHE_SIZE = 4096
+_memory_cache: "OrderedDict[str, str]" = OrderedDict()
+
+
+def _build_messages(prompt: str) -> list:
+    """Chat messages for a prompt: system prompt, few-shot examples, then the request."""
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        *FEW_SHOT_EXAMPLES,
+        {"role": "user", "content": prompt}
+    ]
+
+
+# The system prompt and few-shot examples open every request unchanged, so the
+# request body up to the end of them is serialized once per model; each request only
+# encodes the conversation that follows and closes the brackets
+_STATIC_MESSAGES = ({"role": "system", "content": SYSTEM_PROMPT}, *FEW_SHOT_EXAMPLES)
+_STATIC_PROMPT_CHARS = sum(len(m["content"]) for m in _STATIC_MESSAGES)
+
+
+@lru_cache(maxsize=8)
+def _request_prefix(model: str) -> bytes:
+    """Request body for `model` up to the end of the static messages, without "]}"."""
+    return orjson.dumps({
+        "model": model,
+        "temperature": LLM_TEMPERATURE,
+        "max_tokens": LLM_MAX_TOKENS,
+        "stream": True,
+        "messages": _STATIC_MESSAGES,
+    })[:-2]
+
+
+def _request_body(messages: list) -> bytes:
+    """Streaming completion request for the static prefix followed by `messages`."""
+    # Keyed by the current model, so the body and the cache key always agree
+    return _request_prefix(settings.openrouter_model) + b"," + orjson.dumps(messages)[1:] + b"}"
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Whitespace-insensitive form of a prompt, used for cache lookups."""
+    # Case is kept: it can be on-screen text ("Show text Hello")
+    return " ".join(prompt.split())
+
+
+def llm_cache_key(prompt: str) -> str:
+    """
+    SHA256 over the canonical JSON of everything that determines the model's answer.
+    The prompt is normalized first, so re-typed prompts that differ only in
+    whitespace share one entry; case is kept.
+    """
+    payload = {
+        "version": LLM_CACHE_VERSION,
+        "provider": LLM_PROVIDER,
+        "model": settings.openrouter_model,
+        "messages": _build_messages(normalize_prompt(prompt)),
+        "temperature": LLM_TEMPERATURE,
+        "max_tokens": LLM_MAX_TOKENS,
+    }
+    return hashlib.sha256(orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+
+def _remember(key: str, code: str) -> None:
+    _memory_cache[key] = code
+    _memory_cache.move_to_end(key)
+    if len(_memory_cache) > LLM_MEMORY_CACHE_SIZE:
+        _memory_cache.popitem(last=False)
+
+
+def llm_cache(func):
+    """
+    Cache generated code by prompt and request parameters.
+    Hits are served from memory first, then from the llm_cache table.
+    Behaviour follows settings.llm_cache_mode (enabled / replay / disabled).
+    With use_cache=False the lookup is skipped and the fresh result replaces
+    the stored entry (replay mode still only reads).
+    """
+    @wraps(func)
+    async def wrapper(prompt: str, *args, use_cache: bool = True, **kwargs) -> str:
+        mode = settings.llm_cache_mode
+        if mode == "disabled":
+            return await func(prompt, *args, **kwargs)
+        
+        key = llm_cache_key(prompt)
+        if use_cache or mode == "replay":
+            cached = _memory_cache.get(key)
+            if cached is not None:
+                _memory_cache.move_to_end(key)
+                return cached
+            
+            cached = await db.get_llm_response(key)
+            if cached is not None:
+                _remember(key, cached)
+                return cached
+        if mode == "replay":
+            raise Exception(f"LLM cache miss in replay mode for prompt: {prompt[:50]}")
+        
+        code = await func(prompt, *args, **kwargs)
+        await db.put_llm_response(key, settings.openrouter_model, code)
+        _remember(key, code)
+        return code
     
-    # If no code blocks, assume the entire response is code
-    return response_text.strip()
+    return wrapper
+
+
+def _has_api_key() -> bool:
+    """Check if an API key is configured (not empty and not placeholder)."""
+    api_key = settings.openrouter_api_key
+    return bool(api_key) and api_key != "your_openrouter_api_key_here" and not api_key.startswith("your_")
 
 
-async def generate_manim_code(prompt: str, max_retries: int = 2) -> str:
+async def generate_manim_code(prompt: str, max_retries: int = 2, use_cache: bool = True) -> str:
     """
     Generate Manim code from a text prompt using OpenRouter API.
     Falls back to mock code if API key is not configured.
@@ -960,23 +936,147 @@ async def generate_manim_code(prompt: str, max_retries: int = 2) -> str:
     Args:
         prompt: User's description of the animation
         max_retries: Number of retry attempts if generation fails
+        use_cache: False to always ask the LLM, replacing any cached code
     
     Returns:
         Valid Manim Python code
     """
-    # Check if API key is configured (not empty and not placeholder)
-    api_key = settings.openrouter_api_key
-    if not api_key or api_key == "your_openrouter_api_key_here" or api_key.startswith("your_"):
+    if not _has_api_key():
         # Use mock mode for demo/testing
         print(f"[MOCK MODE] No API key configured, using mock code for prompt: {prompt[:50]}...")
         return get_mock_code(prompt)
     
-    # Build messages with few-shot examples
-    messages = [
-        {"role": "system", "content": SYSTEM_PROMPT},
-        *FEW_SHOT_EXAMPLES,
-        {"role": "user", "content": prompt}
-    ]
+    return await _generate_with_openrouter(prompt, max_retries, use_cache=use_cache)
+
+
+async def aget_multi_scene_codes(prompt: str, num_scenes: int = 5, concurrency: int = MULTI_SCENE_CONCURRENCY) -> list:
+    """
+    Async counterpart of get_multi_scene_codes that asks the LLM for each scene.
+    
+    The scenes are requested concurrently, at most `concurrency` at a time. A
+    scene whose generation fails falls back to its template code, and without
+    an API key the whole set comes from the templates.
+    
+    Returns:
+        List of (scene_prompt, scene_code) tuples in scene order
+    """
+    if not _has_api_key():
+        # Templating all scenes takes ~10 us (less once memoized), well under the
+        # cost of a thread hop, so it runs inline on the event loop
+        return list(get_multi_scene_codes(prompt, num_scenes))
+    
+    scene_parts = split_topic_into_scenes(prompt)[:num_scenes]
+    total = len(scene_parts)
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def generate_part(index: int, title: str, description: str):
+        scene_prompt = f"{prompt}\n\nThis is scene {index + 1} of {total}, \"{title}\": {description}"
+        async with semaphore:
+            try:
+                return title, await _generate_with_openrouter(scene_prompt, 2)
+            except Exception as e:
+                print(f"[MULTI SCENE] Scene {index + 1} fell back to template code: {e}")
+                return title, generate_scene_code_for_part(title, description, index, total)
+    
+    return await asyncio.gather(*(
+        generate_part(i, title, description)
+        for i, (title, description) in enumerate(scene_parts)
+    ))
+
+
+# Backoff before retrying a failed request: 1, 2, 4, 8, 8... seconds, each
+# scaled by a random 0.5-1.5 so concurrent callers don't retry in lockstep
+RETRY_BACKOFF_BASE = 1.0
+RETRY_BACKOFF_MAX = 8.0
+
+
+class _TransientAPIError(Exception):
+    """An OpenRouter failure worth retrying (rate limit, 5xx, provider error mid-stream)."""
+
+
+def _backoff_seconds(attempt: int) -> float:
+    return min(RETRY_BACKOFF_BASE * 2 ** attempt, RETRY_BACKOFF_MAX) * (0.5 + random.random())
+
+
+def _api_error_message(response: httpx.Response) -> str:
+    try:
+        return orjson.loads(response.content).get("error", {}).get("message", response.text)
+    except (orjson.JSONDecodeError, AttributeError):
+        return response.text  # e.g. an HTML error page from a proxy
+
+
+async def _stream_completion(client: httpx.AsyncClient, headers: dict, messages: list) -> str:
+    """
+    Stream one chat completion from OpenRouter and return its text.
+    
+    `messages` is the conversation after the system prompt and few-shot
+    examples, which _request_body puts in front. Reading stops as soon as the
+    first fenced code block is closed, since extract_code ignores anything the
+    model writes after it.
+    """
+    reserved = _estimate_tokens(messages)
+    await _throttle.acquire(reserved)
+    body = _request_body(messages)
+    
+    parts = []
+    used = None
+    try:
+        async with client.stream("POST", OPENROUTER_API_URL, headers=headers, content=body) as response:
+            if response.status_code == 429:
+                # Rate limited: hold back every caller for as long as the server asks
+                _throttle.defer(retry_after_seconds(response.headers))
+                raise _TransientAPIError("OpenRouter rate limit exceeded")
+            
+            if response.status_code != 200:
+                await response.aread()
+                message = f"OpenRouter API error: {_api_error_message(response)}"
+                if response.status_code >= 500:
+                    raise _TransientAPIError(message)
+                raise Exception(message)  # bad request or key: retrying won't help
+            
+            async for line in response.aiter_lines():
+                # Server-sent events; other lines are keep-alive comments
+                if not line.startswith("data:"):
+                    continue
+                payload = line[5:].strip()
+                if payload == "[DONE]":
+                    break
+                
+                chunk = orjson.loads(payload)
+                if "error" in chunk:
+                    # The upstream provider failed after the stream started
+                    raise _TransientAPIError(f"OpenRouter API error: {chunk['error'].get('message', payload)}")
+                if chunk.get("usage"):
+                    used = chunk["usage"].get("total_tokens")
+                
+                choices = chunk.get("choices")
+                delta = choices[0].get("delta", {}).get("content") if choices else None
+                if delta:
+                    parts.append(delta)
+                    # A fence can be split across deltas, so recount on any backtick
+                    if "`" in delta and "".join(parts).count("```") >= 2:
+                        break
+    except BaseException:
+        _throttle.settle(reserved, 0 if not parts else None)
+        raise
+    
+    _throttle.settle(reserved, used)
+    return "".join(parts)
+
+
+@llm_cache
+async def _generate_with_openrouter(prompt: str, max_retries: int) -> str:
+    """
+    Ask OpenRouter for code, feeding validation errors back on retry.
+    
+    Rate limits, 5xx responses and network errors are retried after a jittered
+    exponential backoff; other API errors (e.g. a bad key) fail immediately.
+    """
+    # Only the real-LLM path validates, so demo mode never loads the validator
+    from .code_validator import validate_manim_code
+    
+    # The system prompt and few-shot examples are added by _request_body
+    messages = [{"role": "user", "content": prompt}]
     
     headers = {
         "Authorization": f"Bearer {settings.openrouter_api_key}",
@@ -987,51 +1087,38 @@ async def generate_manim_code(prompt: str, max_retries: int = 2) -> str:
     
     last_error = None
     
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        for attempt in range(max_retries + 1):
-            try:
-                response = await client.post(
-                    OPENROUTER_API_URL,
-                    headers=headers,
-                    json={
-                        "model": settings.openrouter_model,
-                        "messages": messages,
-                        "temperature": 0.7,
-                        "max_tokens": 2000
-                    }
-                )
-                
-                if response.status_code != 200:
-                    error_data = response.json()
-                    raise Exception(f"OpenRouter API error: {error_data.get('error', {}).get('message', response.text)}")
-                
-                data = response.json()
-                generated_text = data["choices"][0]["message"]["content"]
-                generated_code = extract_code(generated_text)
-                
-                # Validate the generated code
-                is_valid, error_message = validate_manim_code(generated_code)
-                
-                if is_valid:
-                    return generated_code
-                
-                # If invalid, add error context and retry
-                if attempt < max_retries:
-                    messages.append({"role": "assistant", "content": generated_text})
-                    messages.append({
-                        "role": "user", 
-                        "content": f"The previous code had an error: {error_message}\nPlease fix it and generate valid Manim code."
-                    })
-                else:
-                    last_error = error_message
-                    
-            except httpx.TimeoutException:
-                last_error = "Request timed out"
-                if attempt == max_retries:
-                    raise Exception(f"Failed to generate Manim code: {last_error}")
-            except Exception as e:
-                last_error = str(e)
-                if attempt == max_retries:
-                    raise Exception(f"Failed to generate Manim code: {last_error}")
+    client = get_http_client()
+    for attempt in range(max_retries + 1):
+        try:
+            generated_text = await _stream_completion(client, headers, messages)
+        except (_TransientAPIError, httpx.TransportError) as e:
+            # Rate limits, server errors, timeouts and dropped connections
+            last_error = "Request timed out" if isinstance(e, httpx.TimeoutException) else str(e)
+            if attempt == max_retries:
+                raise Exception(f"Failed to generate Manim code: {last_error}")
+            await asyncio.sleep(_backoff_seconds(attempt))
+            continue
+        except Exception as e:
+            raise Exception(f"Failed to generate Manim code: {e}")
+        
+        generated_code = extract_code(generated_text)
+        
+        # Validate the generated code (in a thread: the verdict cache is sqlite3)
+        is_valid, error_message = await asyncio.to_thread(validate_manim_code, generated_code)
+        
+        if is_valid:
+            return generated_code
+        
+        # If invalid, retry with only the latest attempt and its error as
+        # context, so each retry costs about as much as the first request
+        last_error = error_message
+        messages = [
+            messages[0],
+            {"role": "assistant", "content": f"```python\n{generated_code}\n```"},
+            {
+                "role": "user",
+                "content": f"The previous code had an error: {error_message}\nPlease fix it and generate valid Manim code."
+            },
+        ]
     
     raise Exception(f"Failed to generate valid Manim code after {max_retries + 1} attempts: {last_error}")
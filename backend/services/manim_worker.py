@@ -0,0 +1,111 @@
+"""
+Warm worker processes for rendering Manim scenes in-process.
+
+Starting the manim CLI imports Manim (numpy, Cairo, Pango, ...) from scratch
+for every scene, which takes 1-2 s. These workers import it once and then
+exec each scene script and call Scene.render() directly. Workers are replaced
+after MAX_RENDERS_PER_WORKER scenes so state leaked by user code does not
+pile up.
+"""
+import asyncio
+import importlib.util
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from types import CodeType
+from typing import Optional
+
+from config import get_settings
+
+settings = get_settings()
+
+MAX_RENDERS_PER_WORKER = 50
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def available() -> bool:
+    """Whether scenes can be rendered in-process (enabled and Manim importable)."""
+    return settings.manim_in_process and importlib.util.find_spec("manim") is not None
+
+
+def _warm_up() -> None:
+    import manim  # noqa: F401  (pay the import once per worker)
+
+
+@lru_cache(maxsize=256)
+def _compile_scene(source: str) -> CodeType:
+    """Compile a scene script once per worker; re-renders of the same code reuse it."""
+    # Every script is written as <temp dir>/scene.py, so the name is stable
+    return compile(source, "scene.py", "exec")
+
+
+def _render(script_path: str, media_dir: str, output_name: str, renderer: str) -> str:
+    """Render GeneratedScene from a script inside a worker; returns the movie path."""
+    from manim import tempconfig
+
+    with open(script_path) as f:
+        source = f.read()
+
+    # Same options as `manim render [--renderer=opengl --write_to_movie] -ql
+    # -o <output_name> --media_dir <media_dir>` with the CLI's cache config
+    options = {
+        "renderer": renderer,
+        "write_to_movie": True,
+        "quality": "low_quality",
+        "media_dir": media_dir,
+        "output_file": output_name,
+        "input_file": script_path,
+    }
+    if settings.manim_cache_dir:
+        cache_dir = os.path.abspath(settings.manim_cache_dir)
+        options["tex_dir"] = os.path.join(cache_dir, "Tex")
+        options["text_dir"] = os.path.join(cache_dir, "texts")
+    with tempconfig(options):
+        namespace = {"__name__": "generated_scene", "__file__": script_path}
+        exec(_compile_scene(source), namespace)
+        scene = namespace["GeneratedScene"]()
+        scene.render()
+        return str(scene.renderer.file_writer.movie_file_path)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # One scene per worker at a time; render_service never runs more at once
+        from .render_service import RENDER_CONCURRENCY
+        
+        # Spawned, not forked: a fresh interpreter per worker, and required
+        # for max_tasks_per_child
+        _pool = ProcessPoolExecutor(
+            max_workers=RENDER_CONCURRENCY,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_warm_up,
+            max_tasks_per_child=MAX_RENDERS_PER_WORKER,
+        )
+    return _pool
+
+
+async def render(script_path: str, media_dir: str, output_name: str, renderer: str = "cairo") -> str:
+    """Render a scene script in a warm worker ("cairo" or "opengl") and return the path of the video."""
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(
+            _get_pool(), _render, script_path, media_dir, output_name, renderer
+        )
+    except BrokenProcessPool:
+        # A worker died mid-render (e.g. killed for memory); start fresh next time
+        shutdown()
+        raise Exception("Manim render failed: render worker crashed")
+    except Exception as e:
+        raise Exception(f"Manim render failed: {e}")
+
+
+def shutdown() -> None:
+    """Stop the worker processes."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -0,0 +1,401 @@
+"""
+Static Manim templates used in demo mode (no OpenRouter API key).
+
+Kept out of llm_service so the strings are only loaded when mock code is
+actually requested; llm_service imports this module lazily. The values are
+handed out by memoized lookups, so they must stay plain (immutable) strings.
+"""
+
+# Mock code templates for demo mode (when no API key is set)
+MOCK_CODE_TEMPLATES = {
+    "circle": '''from manim import *
+
+class GeneratedScene(Scene):
+    def construct(self):
+        circle = Circle(color=BLUE, fill_opacity=0.5)
+        self.play(Create(circle))
+        self.wait(0.5)
+        self.play(circle.animate.scale(1.5))
+        self.play(circle.animate.shift(RIGHT * 2))
+        self.play(circle.animate.shift(LEFT * 2))
+        self.wait(1)
+''',
+    "square": '''from manim import *
+
+class GeneratedScene(Scene):
+    def construct(self):
+        square = Square(color=RED, fill_opacity=0.5)
+        self.play(Create(square))
+        self.wait(0.5)
+        self.play(Rotate(square, PI/2))
+        self.play(square.animate.scale(0.5))
+        self.wait(1)
+''',
+    "triangle": '''from manim import *
+
+class GeneratedScene(Scene):
+    def construct(self):
+        triangle = Triangle(color=GREEN, fill_opacity=0.5)
+        self.play(Create(triangle))
+        self.wait(0.5)
+        self.play(Rotate(triangle, PI))
+        self.play(triangle.animate.scale(1.5))
+        self.wait(1)
+''',
+    "transform": '''from manim import *
+
+class GeneratedScene(Scene):
+    def construct(self):
+        circle = Circle(color=BLUE, fill_opacity=0.5)
+        square = Square(color=RED, fill_opacity=0.5)
+        triangle = Triangle(color=GREEN, fill_opacity=0.5)
+        
+        self.play(Create(circle))
+        self.wait(0.5)
+        self.play(Transform(circle, square))
+        self.wait(0.5)
+        self.play(Transform(circle, triangle))
+        self.wait(1)
+''',
+    "pythagorean": '''from manim import *
+
+class GeneratedScene(Scene):
+    def construct(self):
+        # Title
+        title = Text("Pythagorean Theorem", font_size=36, color=YELLOW)
+        title.to_edge(UP)
+        self.play(Write(title))
+        
+        # Create right triangle
+        triangle = Polygon(
+            ORIGIN, RIGHT * 3, RIGHT * 3 + UP * 2,
+            color=WHITE, fill_opacity=0.3
+        ).shift(LEFT * 1.5 + DOWN * 0.5)
+        
+        self.play(Create(triangle))
+        self.wait(0.5)
+        
+        # Labels
+        a_label = MathTex("a").next_to(triangle, DOWN)
+        b_label = MathTex("b").next_to(triangle, RIGHT)
+        c_label = MathTex("c").move_to(triangle.get_center() + UP * 0.5 + LEFT * 0.5)
+        
+        self.play(Write(a_label), Write(b_label), Write(c_label))
+        self.wait(0.5)
+        
+        # Formula
+        formula = MathTex("a^2 + b^2 = c^2", font_size=48)
+        formula.to_edge(DOWN)
+        self.play(Write(formula))
+        self.wait(2)
+''',
+    "sort": '''from manim import *
+
+class GeneratedScene(Scene):
+    def construct(self):
+        # Title
+        title = Text("Bubble Sort", font_size=36, color=YELLOW)
+        title.to_edge(UP)
+        self.play(Write(title))
+        
+        # Create bars
+        values = [4, 2, 5, 1, 3]
+        bars = VGroup()
+        for i, val in enumerate(values):
+            bar = Rectangle(width=0.6, height=val * 0.5, fill_opacity=0.7, color=BLUE)
+            bar.move_to(RIGHT * (i - 2) * 0.8)
+            bars.add(bar)
+        
+        self.play(Create(bars))
+        self.wait(0.5)
+        
+        # Animate one swap
+        self.play(
+            bars[0].animate.set_color(RED),
+            bars[1].animate.set_color(RED)
+        )
+        self.play(
+            bars[0].animate.shift(RIGHT * 0.8),
+            bars[1].animate.shift(LEFT * 0.8)
+        )
+        self.play(
+            bars[0].animate.set_color(BLUE),
+            bars[1].animate.set_color(BLUE)
+        )
+        self.wait(1)
+''',
+    "client_server": '''from manim import *
+
+class GeneratedScene(Scene):
+    def construct(self):
+        # Client
+        client_box = Rectangle(width=2, height=1.2, color=BLUE, fill_opacity=0.3)
+        client_label = Text("Client", font_size=24).move_to(client_box)
+        client = VGroup(client_box, client_label).shift(LEFT * 4)
+        
+        # Server
+        server_box = Rectangle(width=2, height=1.2, color=GREEN, fill_opacity=0.3)
+        server_label = Text("Server", font_size=24).move_to(server_box)
+        server = VGroup(server_box, server_label)
+        
+        # Database
+        db_box = Rectangle(width=2, height=1.2, color=PURPLE, fill_opacity=0.3)
+        db_label = Text("Database", font_size=20).move_to(db_box)
+        db = VGroup(db_box, db_label).shift(RIGHT * 4)
+        
+        self.play(Create(client), Create(server), Create(db))
+        self.wait(0.5)
+        
+        # Request arrow
+        arrow1 = Arrow(client.get_right(), server.get_left(), color=YELLOW)
+        req_label = Text("Request", font_size=16, color=YELLOW).next_to(arrow1, UP)
+        self.play(GrowArrow(arrow1), Write(req_label))
+        self.wait(0.3)
+        
+        # Query arrow
+        arrow2 = Arrow(server.get_right(), db.get_left(), color=ORANGE)
+        self.play(GrowArrow(arrow2))
+        self.wait(0.3)
+        
+        # Response arrows
+        arrow3 = Arrow(db.get_left(), server.get_right(), color=TEAL).shift(DOWN * 0.3)
+        arrow4 = Arrow(server.get_left(), client.get_right(), color=TEAL).shift(DOWN * 0.3)
+        resp_label = Text("Response", font_size=16, color=TEAL).next_to(arrow4, DOWN)
+        self.play(GrowArrow(arrow3))
+        self.play(GrowArrow(arrow4), Write(resp_label))
+        self.wait(1)
+''',
+    "neural_network": '''from manim import *
+
+class GeneratedScene(Scene):
+    def construct(self):
+        title = Text("Neural Network", font_size=36, color=YELLOW).to_edge(UP)
+        self.play(Write(title))
+        
+        # Create layers
+        layers = []
+        layer_sizes = [3, 4, 4, 2]  # Input, hidden, hidden, output
+        
+        for l, size in enumerate(layer_sizes):
+            layer = VGroup()
+            for i in range(size):
+                neuron = Circle(radius=0.2, color=BLUE, fill_opacity=0.5)
+                neuron.move_to(RIGHT * (l - 1.5) * 2 + UP * (i - (size-1)/2) * 0.8)
+                layer.add(neuron)
+            layers.append(layer)
+        
+        all_neurons = VGroup(*[n for layer in layers for n in layer])
+        self.play(Create(all_neurons))
+        self.wait(0.5)
+        
+        # Animate activation flowing through
+        for layer in layers:
+            self.play(*[n.animate.set_color(GREEN) for n in layer], run_time=0.5)
+        self.wait(1)
+''',
+    "formula": '''from manim import *
+
+class GeneratedScene(Scene):
+    def construct(self):
+        title = Text("Mathematical Formulas", font_size=36, color=YELLOW)
+        title.to_edge(UP)
+        self.play(Write(title))
+        self.wait(0.5)
+        
+        # Quadratic formula
+        quad = MathTex(r"x = \\frac{-b \\pm \\sqrt{b^2 - 4ac}}{2a}")
+        quad.shift(UP)
+        
+        # Euler's identity
+        euler = MathTex(r"e^{i\\pi} + 1 = 0")
+        
+        # Pythagorean
+        pyth = MathTex(r"a^2 + b^2 = c^2")
+        pyth.shift(DOWN)
+        
+        self.play(Write(quad))
+        self.wait(0.5)
+        self.play(Write(euler))
+        self.wait(0.5)
+        self.play(Write(pyth))
+        self.wait(2)
+''',
+    "default": '''from manim import *
+
+class GeneratedScene(Scene):
+    def construct(self):
+        # Welcome text
+        title = Text("Manim Animation", font_size=48, color=BLUE)
+        self.play(Write(title))
+        self.wait(0.5)
+        
+        # Transform to shapes
+        self.play(title.animate.scale(0.5).to_edge(UP))
+        
+        # Create shapes
+        circle = Circle(color=RED, fill_opacity=0.5).shift(LEFT * 2)
+        square = Square(color=GREEN, fill_opacity=0.5)
+        triangle = Triangle(color=BLUE, fill_opacity=0.5).shift(RIGHT * 2)
+        
+        shapes = VGroup(circle, square, triangle)
+        self.play(Create(shapes))
+        self.wait(0.5)
+        
+        # Animate
+        self.play(Rotate(shapes, PI/4))
+        self.play(shapes.animate.shift(UP))
+        self.play(shapes.animate.shift(DOWN))
+        self.wait(1)
+'''
+}
+
+
+# Multi-scene templates for creating 30-second videos (5-6 scenes @ ~5 seconds each)
+MULTI_SCENE_TEMPLATES = {
+    "intro": '''from manim import *
+
+class GeneratedScene(Scene):
+    def construct(self):
+        # Intro scene with title
+        title = Text("{title}", font_size=56, color=BLUE)
+        subtitle = Text("{subtitle}", font_size=28, color=GRAY).next_to(title, DOWN)
+        
+        self.play(Write(title), run_time=1.5)
+        self.play(FadeIn(subtitle), run_time=0.5)
+        self.wait(1.5)
+        self.play(FadeOut(title), FadeOut(subtitle))
+        self.wait(0.5)
+''',
+    "concept1": '''from manim import *
+
+class GeneratedScene(Scene):
+    def construct(self):
+        # First concept visualization
+        header = Text("Step 1", font_size=32, color=YELLOW).to_edge(UP)
+        self.play(Write(header))
+        
+        shape = Circle(color=BLUE, fill_opacity=0.6)
+        label = Text("Core Concept", font_size=24).next_to(shape, DOWN)
+        
+        self.play(Create(shape))
+        self.play(Write(label))
+        self.wait(0.5)
+        self.play(shape.animate.scale(1.3))
+        self.wait(1)
+        self.play(FadeOut(shape), FadeOut(label), FadeOut(header))
+''',
+    "concept2": '''from manim import *
+
+class GeneratedScene(Scene):
+    def construct(self):
+        # Second concept - transformation
+        header = Text("Step 2", font_size=32, color=YELLOW).to_edge(UP)
+        self.play(Write(header))
+        
+        circle = Circle(color=BLUE, fill_opacity=0.5)
+        square = Square(color=RED, fill_opacity=0.5)
+        triangle = Triangle(color=GREEN, fill_opacity=0.5)
+        
+        self.play(Create(circle))
+        self.wait(0.3)
+        self.play(Transform(circle, square))
+        self.wait(0.3)
+        self.play(Transform(circle, triangle))
+        self.wait(0.5)
+        self.play(FadeOut(circle), FadeOut(header))
+''',
+    "concept3": '''from manim import *
+
+class GeneratedScene(Scene):
+    def construct(self):
+        # Third concept - movement and grouping
+        header = Text("Step 3", font_size=32, color=YELLOW).to_edge(UP)
+        self.play(Write(header))
+        
+        shapes = VGroup(
+            Circle(color=RED, fill_opacity=0.5).shift(LEFT * 2),
+            Square(color=GREEN, fill_opacity=0.5),
+            Triangle(color=BLUE, fill_opacity=0.5).shift(RIGHT * 2)
+        )
+        
+        self.play(Create(shapes))
+        self.wait(0.3)
+        self.play(Rotate(shapes, PI/2))
+        self.play(shapes.animate.arrange(DOWN))
+        self.wait(0.5)
+        self.play(FadeOut(shapes), FadeOut(header))
+''',
+    "diagram": '''from manim import *
+
+class GeneratedScene(Scene):
+    def construct(self):
+        # Diagram scene with connections
+        header = Text("Architecture", font_size=32, color=YELLOW).to_edge(UP)
+        self.play(Write(header))
+        
+        # Create boxes
+        box1 = VGroup(
+            Rectangle(width=1.8, height=1, color=BLUE, fill_opacity=0.3),
+            Text("A", font_size=20)
+        ).shift(LEFT * 3)
+        
+        box2 = VGroup(
+            Rectangle(width=1.8, height=1, color=GREEN, fill_opacity=0.3),
+            Text("B", font_size=20)
+        )
+        
+        box3 = VGroup(
+            Rectangle(width=1.8, height=1, color=PURPLE, fill_opacity=0.3),
+            Text("C", font_size=20)
+        ).shift(RIGHT * 3)
+        
+        self.play(Create(box1), Create(box2), Create(box3))
+        
+        arrow1 = Arrow(box1.get_right(), box2.get_left(), color=YELLOW)
+        arrow2 = Arrow(box2.get_right(), box3.get_left(), color=YELLOW)
+        
+        self.play(GrowArrow(arrow1), GrowArrow(arrow2))
+        self.wait(1.5)
+        self.play(FadeOut(VGroup(box1, box2, box3, arrow1, arrow2, header)))
+''',
+    "summary": '''from manim import *
+
+class GeneratedScene(Scene):
+    def construct(self):
+        # Summary/conclusion scene
+        header = Text("Summary", font_size=36, color=YELLOW)
+        header.to_edge(UP)
+        self.play(Write(header))
+        
+        points = VGroup(
+            Text("✓ Concept 1: Visualization", font_size=24, color=GREEN),
+            Text("✓ Concept 2: Transformation", font_size=24, color=GREEN),
+            Text("✓ Concept 3: Animation", font_size=24, color=GREEN),
+        ).arrange(DOWN, aligned_edge=LEFT, buff=0.4)
+        
+        for point in points:
+            self.play(Write(point), run_time=0.6)
+            self.wait(0.3)
+        
+        self.wait(1)
+        self.play(FadeOut(points), FadeOut(header))
+''',
+    "outro": '''from manim import *
+
+class GeneratedScene(Scene):
+    def construct(self):
+        # Outro with thank you
+        thanks = Text("Thank You!", font_size=56, color=BLUE)
+        
+        self.play(Write(thanks))
+        self.wait(0.5)
+        
+        # Animate with colors
+        self.play(thanks.animate.set_color(RED))
+        self.play(thanks.animate.set_color(GREEN))
+        self.play(thanks.animate.set_color(BLUE))
+        
+        self.wait(1)
+        self.play(FadeOut(thanks))
+'''
+}
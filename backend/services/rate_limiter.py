@@ -0,0 +1,103 @@
+"""
+Client-side rate limiting for outbound OpenRouter requests.
+
+Limits are per worker process: with several Gunicorn workers, divide the
+account's limits by WEB_CONCURRENCY.
+"""
+import asyncio
+import time
+from email.utils import parsedate_to_datetime
+from typing import Mapping, Optional
+
+# Never wait longer than this on a single Retry-After header
+MAX_RETRY_AFTER = 60.0
+
+
+class _TokenBucket:
+    """Bucket holding up to `capacity` units that refills completely once per `period`."""
+
+    def __init__(self, capacity: float, period: float = 60.0):
+        self.capacity = capacity
+        self._fill_rate = capacity / period
+        self._level = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._level = min(self.capacity, self._level + (now - self._updated) * self._fill_rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` units are available (0 if they are now)."""
+        self._refill()
+        return max(0.0, (min(amount, self.capacity) - self._level) / self._fill_rate)
+
+    def take(self, amount: float) -> None:
+        self._refill()
+        self._level -= min(amount, self.capacity)
+
+    def give_back(self, amount: float) -> None:
+        self._refill()
+        self._level = min(self.capacity, self._level + amount)
+
+
+class RequestThrottle:
+    """
+    Requests-per-minute and tokens-per-minute limiter shared by concurrent calls.
+
+    A call reserves its worst-case token count before sending (prompt estimate
+    plus max_tokens) and settles with the real usage afterwards, refunding the
+    difference. A limit of 0 disables that bucket. A 429 pauses every caller
+    for the server's Retry-After interval via defer().
+    """
+
+    def __init__(self, requests_per_minute: int = 0, tokens_per_minute: int = 0):
+        self._requests = _TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self._tokens = _TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self._resume_at = 0.0
+        # Callers queue here one at a time, so capacity is handed out in arrival order
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: int = 0) -> None:
+        """Wait until one request reserving `tokens` tokens may be sent."""
+        async with self._lock:
+            while True:
+                delay = self._resume_at - time.monotonic()
+                if self._requests is not None:
+                    delay = max(delay, self._requests.wait_time(1))
+                if self._tokens is not None:
+                    delay = max(delay, self._tokens.wait_time(tokens))
+                if delay <= 0:
+                    break
+                await asyncio.sleep(delay)
+
+            if self._requests is not None:
+                self._requests.take(1)
+            if self._tokens is not None:
+                self._tokens.take(tokens)
+
+    def settle(self, reserved: int, used: Optional[int]) -> None:
+        """Refund the part of a reservation the response did not use."""
+        if self._tokens is not None and used is not None and used < reserved:
+            self._tokens.give_back(reserved - used)
+
+    def defer(self, seconds: float) -> None:
+        """Hold back all new requests for `seconds` (e.g. after a 429)."""
+        self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+
+
+def retry_after_seconds(headers: Mapping[str, str], default: float = 1.0) -> float:
+    """Parse a Retry-After header (delta-seconds or HTTP date), capped at MAX_RETRY_AFTER."""
+    value = headers.get("retry-after")
+    if not value:
+        return default
+
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return default
+
+    return min(max(seconds, 0.0), MAX_RETRY_AFTER)
@@ -3,29 +3,325 @@ Render service for executing Manim scripts and generating videos.
 """
 import os
 import asyncio
+import hashlib
 import subprocess
+import sys
 import tempfile
 import shutil
-from typing import Dict, List, Optional
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Not POSIX: only this process's renders are limited
+    fcntl = None
 
 from config import get_settings
+from . import manim_worker
 
 settings = get_settings()
 
+# Most scenes rendered at once on this machine. Manim renders are CPU-bound
+# and single-threaded, so more than the cores available only adds contention.
+# Every Gunicorn worker allows this many, and the lock files in
+# RENDER_SLOT_DIR keep the workers together within the same total.
+RENDER_CONCURRENCY = min(4, os.cpu_count() or 2)
+RENDER_SLOT_DIR = os.path.join(tempfile.gettempdir(), "manimgen_render_slots")
+_SLOT_POLL_SECONDS = 0.2
+_render_slots = asyncio.Semaphore(RENDER_CONCURRENCY)
+
+RENDER_QUALITY_FLAG = "-ql"  # Low quality for faster rendering (use -qh for high quality)
+# Directory Manim writes videos into for each quality flag
+_QUALITY_DIRS = {"-ql": "480p15", "-qm": "720p30", "-qh": "1080p60", "-qk": "2160p60"}
+
+# Manim writes tens of MB of partial movies and images per scene; by default
+# they go to tmpfs when it has room for several concurrent renders (Docker's
+# /dev/shm is only 64 MB unless --shm-size is raised)
+_SHM_DIR = "/dev/shm"
+_SHM_MIN_FREE = 1 << 30
+
+
+def _default_render_temp_dir() -> Optional[str]:
+    try:
+        stats = os.statvfs(_SHM_DIR)
+    except (OSError, AttributeError):  # no /dev/shm, or not POSIX
+        return None
+    if os.access(_SHM_DIR, os.W_OK) and stats.f_bavail * stats.f_frsize >= _SHM_MIN_FREE:
+        return _SHM_DIR
+    return None
+
+
+RENDER_TEMP_DIR = settings.render_temp_dir or _default_render_temp_dir()
+
+
+_opengl: Optional[bool] = None
+
+
+async def _use_opengl() -> bool:
+    """
+    Whether to render with Manim's OpenGL renderer, per settings.manim_renderer.
+    "auto" checks once, in a throwaway interpreter, that a GL context can be
+    created here; headless servers without GL get Cairo.
+    """
+    global _opengl
+    if settings.manim_renderer != "auto":
+        return settings.manim_renderer == "opengl"
+    if _opengl is None:
+        try:
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, "-c",
+                "import moderngl; moderngl.create_standalone_context().release()",
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL
+            )
+            _opengl = await process.wait() == 0
+        except OSError:
+            _opengl = False
+    return _opengl
+
+
+def _cli_config_args() -> List[str]:
+    """
+    --config_file pointing the CLI's LaTeX and Text caches at manim_cache_dir,
+    which outlives the per-render media dirs (written on first use).
+    """
+    if not settings.manim_cache_dir:
+        return []
+    cache_dir = os.path.abspath(settings.manim_cache_dir)
+    config_path = os.path.join(cache_dir, "manim.cfg")
+    if not os.path.exists(config_path):
+        os.makedirs(cache_dir, exist_ok=True)
+        # Written under a per-process name, so workers racing here never
+        # share a half-written file
+        temp_path = f"{config_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as f:
+            f.write(
+                "[CLI]\n"
+                f"tex_dir = {os.path.join(cache_dir, 'Tex')}\n"
+                f"text_dir = {os.path.join(cache_dir, 'texts')}\n"
+            )
+        os.replace(temp_path, config_path)
+    return ["--config_file", config_path]
+
+
+async def _render_with_cli(script_path: str, output_dir: str, scene_id: str, renderer: str) -> str:
+    """Render with a `manim render` subprocess; returns the path of the video."""
+    renderer_args = ["--renderer=opengl", "--write_to_movie"] if renderer == "opengl" else []
+    process = await asyncio.create_subprocess_exec(
+        "manim",
+        "render",
+        *_cli_config_args(),
+        *renderer_args,
+        RENDER_QUALITY_FLAG,
+        "-o", f"{scene_id}",
+        "--media_dir", output_dir,
+        script_path,
+        "GeneratedScene",
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    
+    stdout, stderr = await process.communicate()
+    
+    if process.returncode != 0:
+        error_msg = stderr.decode() if stderr else "Unknown render error"
+        raise Exception(f"Manim render failed: {error_msg}")
+    
+    # Manim writes to media_dir/videos/<script name>/<quality>/<output name>.mp4
+    script_name = os.path.splitext(os.path.basename(script_path))[0]
+    expected = os.path.join(
+        output_dir, "videos", script_name, _QUALITY_DIRS[RENDER_QUALITY_FLAG], f"{scene_id}.mp4"
+    )
+    if os.path.exists(expected):
+        return expected
+    
+    # Unexpected layout (e.g. a different Manim version): search for the video
+    for root, dirs, files in os.walk(output_dir):
+        for file in files:
+            if file.endswith(".mp4"):
+                return os.path.join(root, file)
+    
+    raise Exception("No video file generated")
+
+
+# Videos this process rendered, by code hash: (video path, its inode,
+# thumbnail path or None, duration). The inode tells whether the file has
+# since been replaced by a re-render of that scene with other code.
+RENDER_CACHE_SIZE = 1024
+_rendered: "OrderedDict[str, Tuple[str, int, Optional[str], float]]" = OrderedDict()
+
+
+def _code_hash(code: str) -> str:
+    return hashlib.blake2b(code.encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+
+
+def _link_output(source: str, output_path: str) -> None:
+    """Hard-link source to output_path, replacing it; copy where links are unsupported."""
+    if os.path.abspath(source) == os.path.abspath(output_path):
+        return
+    temp_path = output_path + ".tmp"
+    if os.path.lexists(temp_path):
+        os.remove(temp_path)
+    try:
+        os.link(source, temp_path)
+    except OSError:
+        shutil.copyfile(source, temp_path)
+    os.replace(temp_path, output_path)
+
 
-async def render_scene(code: str, scene_id: str) -> Dict:
+def _reuse_render(code_hash: str, scene_id: str) -> Optional[Dict]:
+    """Result for scene_id from an earlier render of the same code, if its video is intact."""
+    cached = _rendered.get(code_hash)
+    if cached is None:
+        return None
+    video_path, inode, thumbnail_path, duration = cached
+    try:
+        current_inode = os.stat(video_path).st_ino
+    except FileNotFoundError:
+        current_inode = None
+    if current_inode != inode:
+        del _rendered[code_hash]
+        return None
+    _rendered.move_to_end(code_hash)
+    
+    output_filename = f"{scene_id}.mp4"
+    _link_output(video_path, os.path.join(settings.output_dir, output_filename))
+    
+    thumbnail_filename = f"{scene_id}_thumb.png"
+    if thumbnail_path is not None and os.path.exists(thumbnail_path):
+        _link_output(thumbnail_path, os.path.join(settings.output_dir, thumbnail_filename))
+    else:
+        thumbnail_filename = None
+    
+    return {
+        "video_url": f"/outputs/{output_filename}",
+        "thumbnail_url": f"/outputs/{thumbnail_filename}" if thumbnail_filename else None,
+        "duration": duration
+    }
+
+
+def _remember_render(code_hash: str, scene_id: str, result: Dict) -> None:
+    video_path = os.path.join(settings.output_dir, f"{scene_id}.mp4")
+    thumbnail_path = os.path.join(settings.output_dir, f"{scene_id}_thumb.png")
+    _rendered[code_hash] = (
+        video_path,
+        os.stat(video_path).st_ino,
+        thumbnail_path if result["thumbnail_url"] else None,
+        result["duration"],
+    )
+    _rendered.move_to_end(code_hash)
+    if len(_rendered) > RENDER_CACHE_SIZE:
+        _rendered.popitem(last=False)
+
+
+@asynccontextmanager
+async def _machine_render_slot():
+    """Hold one of the RENDER_CONCURRENCY slots shared by every process."""
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(RENDER_SLOT_DIR, exist_ok=True)
+    while True:
+        for slot in range(RENDER_CONCURRENCY):
+            fd = os.open(os.path.join(RENDER_SLOT_DIR, f"slot-{slot}.lock"), os.O_RDWR | os.O_CREAT, 0o666)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                continue
+            try:
+                yield
+            finally:
+                # Closing releases the lock; the OS also releases it if the
+                # worker dies mid-render
+                os.close(fd)
+            return
+        await asyncio.sleep(_SLOT_POLL_SECONDS)
+
+
+async def render_scene(
+    code: str,
+    scene_id: str,
+    on_start: Optional[Callable[[], Awaitable[None]]] = None,
+) -> Dict:
     """
     Render a Manim scene from code.
     
+    At most RENDER_CONCURRENCY renders run at once across all worker
+    processes; further calls wait for a free slot. Code this process has
+    already rendered is not rendered again: the earlier video and thumbnail
+    are hard-linked to this scene.
+    
     Args:
         code: The Manim Python code to execute
         scene_id: Unique identifier for the scene
+        on_start: Awaited once a slot is free, just before rendering starts
     
     Returns:
         Dict with video_url, thumbnail_url, and duration
     """
+    code_hash = _code_hash(code)
+    reused = _reuse_render(code_hash, scene_id)
+    if reused is not None:
+        return reused
+    
+    async with _render_slots, _machine_render_slot():
+        if on_start is not None:
+            await on_start()
+        result = await _render_scene(code, scene_id)
+    _remember_render(code_hash, scene_id, result)
+    return result
+
+
+async def _render_video(script_path: str, output_dir: str, scene_id: str, renderer: str) -> str:
+    if manim_worker.available():
+        # Warm worker process with Manim already imported
+        return await manim_worker.render(script_path, output_dir, scene_id, renderer)
+    return await _render_with_cli(script_path, output_dir, scene_id, renderer)
+
+
+_WARM_UP_SCENE = """from manim import *
+
+class GeneratedScene(Scene):
+    def construct(self):
+        self.add(MathTex("x"), Text("x"))
+        self.wait(0.1)
+"""
+
+
+async def warm_up() -> None:
+    """
+    Render a throwaway scene with MathTex and Text, so LaTeX, dvisvgm and the
+    fonts are loaded (and their cache entries exist) before the first real
+    render. Does nothing when Manim is not installed; failures are only logged.
+    """
+    if not (manim_worker.available() or shutil.which("manim")):
+        return
+    temp_dir = tempfile.mkdtemp(prefix="manim_warmup_", dir=RENDER_TEMP_DIR)
+    script_path = os.path.join(temp_dir, "scene.py")
+    try:
+        with open(script_path, "w") as f:
+            f.write(_WARM_UP_SCENE)
+        await _render_video(script_path, os.path.join(temp_dir, "media"), "warmup", "cairo")
+    except Exception as e:
+        print(f"[RENDER] Warm-up render failed: {e}")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def run_warm_up() -> None:
+    """
+    Entry point for a one-off warm-up process (gunicorn's when_ready hook, the
+    Docker build): run warm_up() and stop the render workers it started.
+    """
+    asyncio.run(warm_up())
+    manim_worker.shutdown()
+
+
+async def _render_scene(code: str, scene_id: str) -> Dict:
     # Create temporary directory for rendering
-    temp_dir = tempfile.mkdtemp(prefix=f"manim_{scene_id}_")
+    temp_dir = tempfile.mkdtemp(prefix=f"manim_{scene_id}_", dir=RENDER_TEMP_DIR)
     script_path = os.path.join(temp_dir, "scene.py")
     
     try:
@@ -36,62 +332,43 @@ async def render_scene(code: str, scene_id: str) -> Dict:
         # Run Manim render command
         output_dir = os.path.join(temp_dir, "media")
         
-        # Execute manim command
-        process = await asyncio.create_subprocess_exec(
-            "manim",
-            "render",
-            "-ql",  # Low quality for faster rendering (use -qh for high quality)
-            "-o", f"{scene_id}",
-            "--media_dir", output_dir,
-            script_path,
-            "GeneratedScene",
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        
-        stdout, stderr = await process.communicate()
-        
-        if process.returncode != 0:
-            error_msg = stderr.decode() if stderr else "Unknown render error"
-            raise Exception(f"Manim render failed: {error_msg}")
-        
-        # Find the output video file
-        video_file = None
-        for root, dirs, files in os.walk(output_dir):
-            for file in files:
-                if file.endswith(".mp4"):
-                    video_file = os.path.join(root, file)
-                    break
-            if video_file:
-                break
-        
-        if not video_file:
-            raise Exception("No video file generated")
+        if await _use_opengl():
+            try:
+                video_file = await _render_video(script_path, output_dir, scene_id, "opengl")
+            except Exception as e:
+                # The OpenGL renderer does not support everything Cairo does
+                print(f"[RENDER] OpenGL render of scene {scene_id} failed, retrying with Cairo: {e}")
+                shutil.rmtree(output_dir, ignore_errors=True)
+                video_file = await _render_video(script_path, output_dir, scene_id, "cairo")
+        else:
+            video_file = await _render_video(script_path, output_dir, scene_id, "cairo")
         
-        # Copy video to output directory
+        # Move video to output directory (a rename when on the same filesystem;
+        # otherwise copyfile, which uses sendfile on Linux). Either way the
+        # output gets a new inode, so videos hard-linked to it are untouched.
         os.makedirs(settings.output_dir, exist_ok=True)
         output_filename = f"{scene_id}.mp4"
         output_path = os.path.join(settings.output_dir, output_filename)
-        shutil.copy2(video_file, output_path)
+        try:
+            os.replace(video_file, output_path)
+        except OSError:
+            shutil.copyfile(video_file, output_path + ".tmp")
+            os.replace(output_path + ".tmp", output_path)
         
-        # Generate thumbnail (first frame)
+        # Thumbnail and duration probe are independent, so run them together
         thumbnail_filename = f"{scene_id}_thumb.png"
         thumbnail_path = os.path.join(settings.output_dir, thumbnail_filename)
+        # ffmpeg overwrites in place, which would also change a hard-linked copy
+        try:
+            os.remove(thumbnail_path)
+        except FileNotFoundError:
+            pass
         
-        await asyncio.create_subprocess_exec(
-            "ffmpeg",
-            "-i", output_path,
-            "-ss", "00:00:01",
-            "-vframes", "1",
-            "-y",
-            thumbnail_path,
-            stdout=asyncio.subprocess.DEVNULL,
-            stderr=asyncio.subprocess.DEVNULL
+        _, duration = await asyncio.gather(
+            _extract_thumbnail(output_path, thumbnail_path),
+            get_video_duration(output_path)
         )
         
-        # Get video duration
-        duration = await get_video_duration(output_path)
-        
         return {
             "video_url": f"/outputs/{output_filename}",
             "thumbnail_url": f"/outputs/{thumbnail_filename}" if os.path.exists(thumbnail_path) else None,
@@ -103,6 +380,23 @@ async def render_scene(code: str, scene_id: str) -> Dict:
         shutil.rmtree(temp_dir, ignore_errors=True)
 
 
+async def _extract_thumbnail(video_path: str, thumbnail_path: str) -> None:
+    """Save the frame at 1s as a PNG (a failed extraction just leaves no thumbnail)."""
+    # -ss before -i seeks on the input instead of decoding up to 1s
+    process = await asyncio.create_subprocess_exec(
+        "ffmpeg",
+        "-hide_banner", "-loglevel", "error",
+        "-ss", "00:00:01",
+        "-i", video_path,
+        "-vframes", "1",
+        "-y",
+        thumbnail_path,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.DEVNULL
+    )
+    await process.wait()
+
+
 async def get_video_duration(video_path: str) -> float:
     """Get the duration of a video file in seconds."""
     try:
@@ -122,6 +416,106 @@ async def get_video_duration(video_path: str) -> float:
         return 5.0  # Default duration
 
 
+# Output options per H.264 encoder, hardware first; libx264 always works
+_ENCODER_OPTIONS = {
+    "h264_nvenc": ["-c:v", "h264_nvenc", "-preset", "p1", "-b:v", "4M"],
+    "h264_videotoolbox": ["-c:v", "h264_videotoolbox", "-b:v", "4M"],
+    "libx264": ["-c:v", "libx264", "-preset", "veryfast", "-crf", "20"],
+}
+_encoders: Optional[List[str]] = None
+
+
+async def _available_encoders() -> List[str]:
+    """Entries of _ENCODER_OPTIONS this ffmpeg build has, probed once per process."""
+    global _encoders
+    if _encoders is None:
+        process = await asyncio.create_subprocess_exec(
+            "ffmpeg", "-hide_banner", "-encoders",
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+        stdout, _ = await process.communicate()
+        listed = {line.split()[1] for line in stdout.decode().splitlines() if len(line.split()) > 1}
+        _encoders = [name for name in _ENCODER_OPTIONS if name in listed or name == "libx264"]
+    return _encoders
+
+
+async def _probe_video_format(video_path: str) -> Optional[tuple]:
+    """(codec, width, height, pixel format, frame rate) of the first video stream."""
+    try:
+        process = await asyncio.create_subprocess_exec(
+            "ffprobe",
+            "-v", "error",
+            "-select_streams", "v:0",
+            "-show_entries", "stream=codec_name,width,height,pix_fmt,r_frame_rate",
+            "-of", "csv=p=0",
+            video_path,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+        stdout, _ = await process.communicate()
+    except OSError:
+        return None
+    fields = stdout.decode().strip().split(",")
+    return tuple(fields) if process.returncode == 0 and len(fields) == 5 else None
+
+
+async def _concat_reencoded(
+    video_paths: List[str],
+    reference: tuple,
+    output_path: str,
+    audio_path: Optional[str] = None
+) -> None:
+    """
+    Concatenate videos with mismatched formats by scaling each onto the
+    reference format and re-encoding, on a hardware encoder when one works.
+    The audio file, if given, is muxed in during the same pass.
+    """
+    # ffprobe prints fields in its own order, not show_entries order:
+    # codec_name, width, height, pix_fmt, r_frame_rate
+    _, width, height, _, fps = reference
+    
+    inputs = []
+    filters = []
+    for i, path in enumerate(video_paths):
+        inputs += ["-i", path]
+        filters.append(
+            f"[{i}:v]scale={width}:{height}:force_original_aspect_ratio=decrease,"
+            f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,fps={fps},format=yuv420p[v{i}]"
+        )
+    labels = "".join(f"[v{i}]" for i in range(len(video_paths)))
+    filter_graph = ";".join(filters) + f";{labels}concat=n={len(video_paths)}:v=1:a=0[v]"
+    
+    maps = ["-map", "[v]"]
+    if audio_path:
+        inputs += ["-i", audio_path]
+        maps += ["-map", f"{len(video_paths)}:a", "-c:a", "aac", "-shortest"]
+    
+    stderr = b""
+    for encoder in list(await _available_encoders()):
+        process = await asyncio.create_subprocess_exec(
+            "ffmpeg",
+            "-hide_banner", "-loglevel", "error",
+            *inputs,
+            "-filter_complex", filter_graph,
+            *maps,
+            *_ENCODER_OPTIONS[encoder],
+            "-y",
+            output_path,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        _, stderr = await process.communicate()
+        if process.returncode == 0:
+            return
+        # A listed hardware encoder can still fail (no GPU): stop offering it
+        # to later exports and try the next one. libx264 is always kept.
+        if encoder != "libx264" and _encoders is not None and encoder in _encoders:
+            _encoders.remove(encoder)
+    
+    raise Exception(f"Video concatenation failed: {stderr.decode()}")
+
+
 async def compile_project(
     scenes: List[Dict],
     project_id: str,
@@ -150,73 +544,76 @@ async def compile_project(
         # Create file list for ffmpeg concat
         file_list_path = os.path.join(temp_dir, "files.txt")
         
-        video_count = 0
+        # One directory read instead of a stat per scene
+        try:
+            with os.scandir(output_dir_abs) as entries:
+                existing = {entry.name for entry in entries if entry.is_file()}
+        except FileNotFoundError:
+            existing = set()
+        
+        video_paths = []
+        for scene in scenes:
+            # Convert URL to absolute file path
+            name = os.path.basename(scene.get("video_url") or "")
+            if name in existing:
+                video_paths.append(os.path.join(output_dir_abs, name))
+        
         with open(file_list_path, "w") as f:
-            for scene in scenes:
-                video_url = scene.get("video_url")
-                if video_url:
-                    # Convert URL to absolute file path
-                    video_path = os.path.join(
-                        output_dir_abs,
-                        os.path.basename(video_url)
-                    )
-                    if os.path.exists(video_path):
-                        f.write(f"file '{video_path}'\n")
-                        video_count += 1
-        
-        if video_count == 0:
+            f.write("".join(f"file '{path}'\n" for path in video_paths))
+        
+        if not video_paths:
             raise Exception("No rendered video files found to compile")
         
         # Output path
         output_filename = f"{project_id}_final.mp4"
         output_path = os.path.join(output_dir_abs, output_filename)
-        temp_output = os.path.join(temp_dir, "combined.mp4")
         
-        # Concatenate videos
-        process = await asyncio.create_subprocess_exec(
-            "ffmpeg",
-            "-f", "concat",
-            "-safe", "0",
-            "-i", file_list_path,
-            "-c", "copy",
-            "-y",
-            temp_output,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        
-        _, stderr = await process.communicate()
-        
-        if process.returncode != 0:
-            raise Exception(f"Video concatenation failed: {stderr.decode()}")
-        
-        # Add audio if provided
+        # Audio to overlay, if provided and still on disk
+        audio_path = None
         if audio_url:
-            upload_dir_abs = os.path.abspath(settings.upload_dir)
             audio_path = os.path.join(
-                upload_dir_abs,
+                os.path.abspath(settings.upload_dir),
                 os.path.basename(audio_url)
             )
-            
-            if os.path.exists(audio_path):
-                process = await asyncio.create_subprocess_exec(
-                    "ffmpeg",
-                    "-i", temp_output,
+            if not os.path.exists(audio_path):
+                audio_path = None
+        
+        # Concatenate videos and mux the audio in one pass: stream copy is only
+        # safe when every scene has the same video parameters, otherwise
+        # re-encode to the first scene's. Scenes ffprobe cannot read are
+        # assumed to match, as before.
+        formats = [fmt for fmt in await asyncio.gather(
+            *(_probe_video_format(path) for path in video_paths)
+        ) if fmt is not None]
+        if len(set(formats)) <= 1:
+            if audio_path:
+                output_args = [
                     "-i", audio_path,
-                    "-c:v", "copy",
-                    "-c:a", "aac",
-                    "-shortest",
-                    "-y",
-                    output_path,
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE
-                )
-                
-                await process.communicate()
+                    "-map", "0:v", "-map", "1:a",
+                    "-c:v", "copy", "-c:a", "aac", "-shortest",
+                ]
             else:
-                shutil.copy2(temp_output, output_path)
+                output_args = ["-c", "copy"]
+            
+            process = await asyncio.create_subprocess_exec(
+                "ffmpeg",
+                "-hide_banner", "-loglevel", "error",
+                "-f", "concat",
+                "-safe", "0",
+                "-i", file_list_path,
+                *output_args,
+                "-y",
+                output_path,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            
+            _, stderr = await process.communicate()
+            
+            if process.returncode != 0:
+                raise Exception(f"Video concatenation failed: {stderr.decode()}")
         else:
-            shutil.copy2(temp_output, output_path)
+            await _concat_reencoded(video_paths, formats[0], output_path, audio_path)
         
         return {
             "video_url": f"/outputs/{output_filename}"
@@ -0,0 +1,30 @@
+from services.code_validator import MAX_CODE_LINES, validate_manim_code
+
+SCENE = """from manim import *
+
+class GeneratedScene(Scene):
+    def construct(self):
+        self.play(Write(Text("Hello")))
+"""
+
+
+def _code_with_lines(count: int) -> str:
+    padding = count - SCENE.count("\n")
+    return SCENE + "# padding\n" * padding
+
+
+def test_accepts_exactly_max_lines_with_trailing_newline():
+    code = _code_with_lines(MAX_CODE_LINES)
+    assert len(code.splitlines()) == MAX_CODE_LINES
+    assert validate_manim_code(code) == (True, "")
+
+
+def test_accepts_exactly_max_lines_without_trailing_newline():
+    code = _code_with_lines(MAX_CODE_LINES).rstrip("\n")
+    assert len(code.splitlines()) == MAX_CODE_LINES
+    assert validate_manim_code(code)[0]
+
+
+def test_rejects_one_line_over_max():
+    code = _code_with_lines(MAX_CODE_LINES + 1)
+    assert validate_manim_code(code) == (False, f"Code exceeds maximum of {MAX_CODE_LINES} lines")